@@ -0,0 +1,71 @@
+import threading
+from array import array
+
+# Accounts are spread over shards by account % shards. A shard keeps its
+# accounts in a flat int64 array indexed by account // shards, 8 bytes an
+# account, grown at most to double its length at a time and to DENSE_SLOTS
+# slots; accounts past that (or negative) go into a dict. Accounts that
+# were never touched hold the initial balance.
+DENSE_SLOTS = 1 << 20
+
+
+class Shard:
+    # `lock` guards the shard's balances and its propagation ticket.
+    def __init__(self, index, initial):
+        self.index = index
+        self.lock = threading.Lock()
+        self.initial = initial
+        self.dense = array("q")
+        self.sparse = {}
+        self.ticket = 0
+
+    def takeTicket(self):
+        # Caller holds self.lock. Propagations of this shard's accounts go
+        # to every peer in ticket order, see Branch.propagate.
+        ticket = (self.index, self.ticket)
+        self.ticket += 1
+        return ticket
+
+
+class AccountTable:
+    def __init__(self, initial, shards=16):
+        self.initial = initial
+        self.shards = [Shard(index, initial) for index in range(shards)]
+
+    def shard(self, account):
+        return self.shards[account % len(self.shards)]
+
+    def get(self, account):
+        shard = self.shards[account % len(self.shards)]
+        slot = account // len(self.shards)
+        if 0 <= slot < len(shard.dense):
+            return shard.dense[slot]
+        return shard.sparse.get(account, self.initial)
+
+    def set(self, account, balance):
+        # Caller holds the account's shard lock.
+        count = len(self.shards)
+        shard = self.shards[account % count]
+        slot = account // count
+        dense = shard.dense
+        if 0 <= slot < len(dense):
+            dense[slot] = balance
+        elif 0 <= slot < min(DENSE_SLOTS, 2 * len(dense) + 1024):
+            length = len(dense)
+            dense.extend(array("q", [self.initial]) * (slot + 1 - length))
+            # Accounts kept in the dict while the array was shorter move in.
+            for moved in [moved for moved in shard.sparse if length <= moved // count <= slot]:
+                dense[moved // count] = shard.sparse.pop(moved)
+            dense[slot] = balance
+        else:
+            shard.sparse[account] = balance
+
+    def add(self, account, amount):
+        # Caller holds the account's shard lock.
+        balance = self.get(account) + amount
+        self.set(account, balance)
+        return balance
+
+    def __len__(self):
+        # Accounts with a slot of their own, touched or not.
+        return sum(len(shard.dense) + len(shard.sparse) for shard in self.shards)
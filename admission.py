@@ -0,0 +1,84 @@
+import threading
+import time
+from concurrent import futures
+
+local = threading.local()
+
+
+class QueueTimingExecutor(futures.ThreadPoolExecutor):
+    # Worker pool for a gRPC server that notes when each call was queued,
+    # so admission control sees the time spent waiting for a worker too.
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(run_queued, time.perf_counter(), fn, args, kwargs)
+
+
+def run_queued(queued, fn, args, kwargs):
+    local.queued = queued
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        local.queued = None
+
+
+def queued_at():
+    # perf_counter() time the running call was queued, None outside a
+    # QueueTimingExecutor.
+    return getattr(local, "queued", None)
+
+
+class AdmissionLimiter:
+    # Caps how many customer requests a branch serves at once, and turns
+    # away requests that already waited too long for a worker, so a backlog
+    # drains in microseconds per request instead of being served late. The
+    # cap follows latency, queueing included, AIMD style: after each window
+    # of `limit` timed requests it grows by one if their mean stayed within
+    # `tolerance` times the baseline, and shrinks by `backoff` otherwise.
+    # The baseline is the lowest window mean seen, allowed to creep up by
+    # `drift` a window so it follows a system that has become slower for
+    # good. A request may wait up to `tolerance` times the baseline.
+    def __init__(self, max_limit, min_limit=1, initial=4, tolerance=2.0, backoff=0.75, drift=1.02):
+        self.lock = threading.Lock()
+        self.maxLimit = max_limit
+        self.minLimit = min_limit
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.drift = drift
+        self.inflight = 0
+        self.baseline = None
+        self.samples = 0
+        self.total = 0.0
+        self.rejected = 0
+
+    def acquire(self, waited=0.0):
+        # Returns False if the request has to be turned away. `waited` is
+        # how long it was queued, in seconds.
+        with self.lock:
+            if self.inflight >= int(self.limit) or (self.baseline is not None and
+                                                   waited > self.tolerance * self.baseline):
+                self.rejected += 1
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self, latency=None):
+        # `latency` in seconds, None for requests that should not move the
+        # cap, e.g. queries, which are far cheaper than updates.
+        with self.lock:
+            self.inflight -= 1
+            if latency is None:
+                return
+            self.samples += 1
+            self.total += latency
+            if self.samples < int(self.limit):
+                return
+            mean = self.total / self.samples
+            self.samples, self.total = 0, 0.0
+            if self.baseline is None:
+                self.baseline = mean
+            else:
+                self.baseline = min(mean, self.baseline * self.drift)
+            if mean > self.tolerance * self.baseline:
+                self.limit = max(self.minLimit, self.limit * self.backoff)
+            else:
+                self.limit = min(self.maxLimit, self.limit + 1)
@@ -0,0 +1,221 @@
+import asyncio
+import signal
+import time
+
+import grpc
+import bank_pb2
+import bank_pb2_grpc
+from branch import ADMITTED, Branch
+from channel_pool import BASE_PORT, SERVER_OPTIONS, ChannelPool
+
+
+class AsyncTurnstile:
+    # asyncio counterpart of branch.Turnstile.
+    def __init__(self):
+        self.cond = asyncio.Condition()
+        self.next = 0
+
+    async def wait(self, ticket):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.next == ticket)
+
+    async def advance(self):
+        async with self.cond:
+            self.next += 1
+            self.cond.notify_all()
+
+
+class AsyncUnordered:
+    # asyncio counterpart of branch.Unordered.
+    async def wait(self, ticket):
+        pass
+
+    async def advance(self):
+        pass
+
+
+class AioBranch(Branch):
+    # Same state, locking and logs as Branch, served from one event loop.
+    # Propagation to all peers is awaited concurrently instead of tying up a
+    # worker thread per outbound call.
+    Turnstile = AsyncTurnstile
+    Unordered = AsyncUnordered
+
+    def __init__(self, id, balance, branches, **options):
+        options["propagation"] = "parallel"
+        super().__init__(id, balance, branches, **options)
+        self.background = set()
+
+    async def warmPeersAsync(self, timeout=None):
+        self.connectPeers()
+        unready = await self.pool.warmAsync(self.peerTargets(), timeout)
+        if not unready:
+            self.ready = True
+        return unready
+
+    async def Health(self, request, context):
+        return Branch.Health(self, request, context)
+
+    async def GetStats(self, request, context):
+        return Branch.GetStats(self, request, context)
+
+    async def sendInTurn(self, i, ticket, msg):
+        shard, ticket = ticket
+        turn = self.peerTurns[i][shard]
+        await turn.wait(ticket)
+        if self.metrics is not None:
+            acked = self.metrics.timer(f"propagate.peer.{self.stubListBranchMapping[i]}")
+        try:
+            response = await self.stubList[i].MsgDelivery(msg)
+        finally:
+            await turn.advance()
+        if self.metrics is not None:
+            acked()
+        return response
+
+    async def skipTurnsAsync(self, ticket, end):
+        # As Branch.skipTurns, for an update that is not propagated at all.
+        shard, number = ticket
+        for i in range(end):
+            turn = self.peerTurns[i][shard]
+            await turn.wait(number)
+            await turn.advance()
+
+    async def propagateAsync(self, ticket, outgoing):
+        if not outgoing:
+            return
+        if self.metrics is not None:
+            fanout = self.metrics.timer("propagate.fanout")
+        tasks = [asyncio.ensure_future(self.sendInTurn(i, ticket, outgoing[i])) for i in range(len(outgoing))]
+        needed = len(tasks) if self.quorum is None else max(0, min(self.quorum, len(tasks)))
+        acked = 0
+        failed = []
+        pending = set(tasks)
+        while acked < needed and len(tasks) - len(failed) >= needed:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    acked += 1
+                else:
+                    failed.append(task.exception())
+        # Stragglers past the quorum still have to finish so later tickets
+        # get their turn; keep them referenced until then.
+        for task in pending:
+            self.background.add(task)
+            task.add_done_callback(self.background.discard)
+        if acked < needed:
+            raise failed[0]
+        if self.metrics is not None:
+            fanout()
+
+    async def MsgDelivery(self, request, context):
+        limiter = self.limiter
+        if limiter is None or request.interface not in ADMITTED:
+            return await self.deliverAsync(request, context)
+        # As Branch.admit.
+        if not limiter.acquire():
+            if self.metrics is not None:
+                self.metrics.count("admission.rejected")
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f"branch {self.id} is overloaded, retry later")
+        start = time.perf_counter()
+        try:
+            return await self.deliverAsync(request, context)
+        finally:
+            limiter.release(None if request.interface == bank_pb2.QUERY else time.perf_counter() - start)
+
+    async def deliverAsync(self, request, context):
+        # Same handlers as Branch.deliver, with the propagation awaited.
+        reader = self.readHandlers.get(request.interface)
+        if reader is not None:
+            if self.wal is not None and not request.stale:
+                # A strict read waits for a WAL commit, off the loop.
+                return await asyncio.get_running_loop().run_in_executor(None, self.read, request, reader)
+            return self.read(request, reader)
+        entry = self.handlers.get(request.interface)
+        if entry is None:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"unknown interface {request.interface}")
+        handler, name = entry
+        metrics = self.metrics
+        if metrics is not None:
+            start = metrics.begin()
+        try:
+            self.recvMsg.append(request)
+            response, ticket, outgoing = handler(request)
+            if self.wal is not None:
+                # fsync off the loop; concurrent handlers share a commit.
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, self.commitUpdates)
+                except BaseException:
+                    if ticket is not None:
+                        await self.skipTurnsAsync(ticket, len(outgoing))
+                    raise
+            if ticket is not None:
+                await self.propagateAsync(ticket, outgoing)
+            self.eventLog.checkpoint()
+        finally:
+            if metrics is not None:
+                metrics.end(name, start)
+        return response
+
+    async def MsgDeliveryStream(self, request_iterator, context):
+        async for request in request_iterator:
+            yield await self.deliverAsync(request, context)
+
+    async def MsgDeliveryBatch(self, request, context):
+        # context.abort is a coroutine here, so the batch is checked first.
+        error = self.batchError(request)
+        if error is not None:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, error)
+        return Branch.MsgDeliveryBatch(self, request, context)
+
+    async def closeAsync(self):
+        self.close()
+
+
+async def create_aio_servers(branches, peers=None, warmup_timeout=30, **options):
+    # aio channels belong to the running loop, so these branches share a
+    # pool of their own.
+    options.setdefault("pool", ChannelPool(aio=True))
+    servers = []
+    servicers = []
+    branchPrcoessId = peers or [branch["id"] for branch in branches]
+    base_port = options.get("base_port", BASE_PORT)
+    for branch_data in branches:
+        server = grpc.aio.server(options=SERVER_OPTIONS)
+        branch = AioBranch(id=branch_data["id"], balance=branch_data["balance"], branches=branchPrcoessId, **options)
+        bank_pb2_grpc.add_BankServicer_to_server(branch, server)
+        port = base_port + branch_data["id"]
+        server.add_insecure_port(f'[::]:{port}')
+        await server.start()
+        print(f"Branch {branch_data['id']} started on port: {port} (aio)")
+        if branch.recovered:
+            print(f"Branch {branch.id} recovered balance {branch.balance} at clock {branch.clock}")
+        servers.append(server)
+        servicers.append(branch)
+    results = await asyncio.gather(*(branch.warmPeersAsync(warmup_timeout) for branch in servicers))
+    for branch, unready in zip(servicers, results):
+        if unready:
+            print(f"Branch {branch.id} could not reach {', '.join(unready)} yet, still trying")
+            branch.background.add(asyncio.ensure_future(branch.warmPeersAsync()))
+    return servers, servicers
+
+
+async def stop_aio_servers(servers, servicers, grace=1):
+    await asyncio.gather(*(server.stop(grace) for server in servers))
+    for branch in servicers:
+        await branch.closeAsync()
+    if servicers:
+        await servicers[0].pool.closeAsync()
+
+
+async def start_aio_servers(branches, **options):
+    servers, servicers = await create_aio_servers(branches, **options)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    try:
+        await stop.wait()
+        print("\nStopping all servers.")
+    finally:
+        await stop_aio_servers(servers, servicers)
@@ -13,18 +13,39 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nbank.proto\"t\n\x12MsgDeliveryRequest\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x10\n\x08\x65vent_id\x18\x02 \x01(\x05\x12\x11\n\tinterface\x18\x03 \x01(\t\x12\r\n\x05money\x18\x04 \x01(\x05\x12\x0f\n\x07\x62\x61lance\x18\x05 \x01(\x05\x12\r\n\x05\x63lock\x18\x06 \x01(\x05\"c\n\x13MsgDeliveryResponse\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x10\n\x08\x65vent_id\x18\x02 \x01(\x05\x12\x0f\n\x07\x62\x61lance\x18\x03 \x01(\x05\x12\x0e\n\x06result\x18\x04 \x01(\t\x12\r\n\x05\x63lock\x18\x05 \x01(\x05\x32\x42\n\x04\x42\x61nk\x12:\n\x0bMsgDelivery\x12\x13.MsgDeliveryRequest\x1a\x14.MsgDeliveryResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nbank.proto\"\xb3\x01\n\x12MsgDeliveryRequest\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x10\n\x08\x65vent_id\x18\x02 \x01(\x05\x12\x1d\n\tinterface\x18\x07 \x01(\x0e\x32\n.Interface\x12\r\n\x05money\x18\x04 \x01(\x05\x12\x0f\n\x07\x62\x61lance\x18\x05 \x01(\x05\x12\r\n\x05\x63lock\x18\x06 \x01(\x05\x12\x0b\n\x03seq\x18\x08 \x01(\x03\x12\r\n\x05stale\x18\t \x01(\x08\x12\x0f\n\x07\x61\x63\x63ount\x18\n \x01(\x03J\x04\x08\x03\x10\x04\"c\n\x13MsgDeliveryResponse\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x10\n\x08\x65vent_id\x18\x02 \x01(\x05\x12\x0f\n\x07\x62\x61lance\x18\x03 \x01(\x05\x12\x0e\n\x06result\x18\x04 \x01(\t\x12\r\n\x05\x63lock\x18\x05 \x01(\x05\"R\n\x17MsgDeliveryBatchRequest\x12\n\n\x02id\x18\x01 \x01(\x05\x12%\n\x08requests\x18\x03 \x03(\x0b\x32\x13.MsgDeliveryRequestJ\x04\x08\x02\x10\x03\"\x0f\n\rHealthRequest\":\n\x0eHealthResponse\x12\n\n\x02id\x18\x01 \x01(\x05\x12\r\n\x05ready\x18\x02 \x01(\x08\x12\r\n\x05peers\x18\x03 \x01(\x05\"\x0e\n\x0cStatsRequest\"b\n\x10LatencyHistogram\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\x03\x12\x10\n\x08total_us\x18\x03 \x01(\x01\x12\x0e\n\x06max_us\x18\x04 \x01(\x01\x12\x0f\n\x07\x62uckets\x18\x05 \x03(\x03\"\x8e\x02\n\rStatsResponse\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x0f\n\x07\x65nabled\x18\x02 \x01(\x08\x12.\n\x08\x63ounters\x18\x03 \x03(\x0b\x32\x1c.StatsResponse.CountersEntry\x12*\n\x06gauges\x18\x04 \x03(\x0b\x32\x1a.StatsResponse.GaugesEntry\x12$\n\tlatencies\x18\x05 \x03(\x0b\x32\x11.LatencyHistogram\x1a/\n\rCountersEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x03:\x02\x38\x01\x1a-\n\x0bGaugesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x03:\x02\x38\x01*{\n\tInterface\x12\x19\n\x15INTERFACE_UNSPECIFIED\x10\x00\x12\t\n\x05QUERY\x10\x01\x12\x0b\n\x07\x44\x45POSIT\x10\x02\x12\x0c\n\x08WITHDRAW\x10\x03\x12\x15\n\x11PROPAGATE_DEPOSIT\x10\x04\x12\x16\n\x12PROPAGATE_WITHDRAW\x10\x05\x32\xa8\x02\n\x04\x42\x61nk\x12:\n\x0bMsgDelivery\x12\x13.MsgDeliveryRequest\x1a\x14.MsgDeliveryResponse\"\x00\x12\x44\n\x10MsgDeliveryBatch\x12\x18.MsgDeliveryBatchRequest\x1a\x14.MsgDeliveryResponse\"\x00\x12\x44\n\x11MsgDeliveryStream\x12\x13.MsgDeliveryRequest\x1a\x14.MsgDeliveryResponse\"\x00(\x01\x30\x01\x12+\n\x06Health\x12\x0e.HealthRequest\x1a\x0f.HealthResponse\"\x00\x12+\n\x08GetStats\x12\r.StatsRequest\x1a\x0e.StatsResponse\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'bank_pb2', _globals)
 if _descriptor._USE_C_DESCRIPTORS == False:
-
   DESCRIPTOR._options = None
-  _globals['_MSGDELIVERYREQUEST']._serialized_start=14
-  _globals['_MSGDELIVERYREQUEST']._serialized_end=130
-  _globals['_MSGDELIVERYRESPONSE']._serialized_start=132
-  _globals['_MSGDELIVERYRESPONSE']._serialized_end=231
-  _globals['_BANK']._serialized_start=233
-  _globals['_BANK']._serialized_end=299
+  _STATSRESPONSE_COUNTERSENTRY._options = None
+  _STATSRESPONSE_COUNTERSENTRY._serialized_options = b'8\001'
+  _STATSRESPONSE_GAUGESENTRY._options = None
+  _STATSRESPONSE_GAUGESENTRY._serialized_options = b'8\001'
+  _globals['_INTERFACE']._serialized_start=847
+  _globals['_INTERFACE']._serialized_end=970
+  _globals['_MSGDELIVERYREQUEST']._serialized_start=15
+  _globals['_MSGDELIVERYREQUEST']._serialized_end=194
+  _globals['_MSGDELIVERYRESPONSE']._serialized_start=196
+  _globals['_MSGDELIVERYRESPONSE']._serialized_end=295
+  _globals['_MSGDELIVERYBATCHREQUEST']._serialized_start=297
+  _globals['_MSGDELIVERYBATCHREQUEST']._serialized_end=379
+  _globals['_HEALTHREQUEST']._serialized_start=381
+  _globals['_HEALTHREQUEST']._serialized_end=396
+  _globals['_HEALTHRESPONSE']._serialized_start=398
+  _globals['_HEALTHRESPONSE']._serialized_end=456
+  _globals['_STATSREQUEST']._serialized_start=458
+  _globals['_STATSREQUEST']._serialized_end=472
+  _globals['_LATENCYHISTOGRAM']._serialized_start=474
+  _globals['_LATENCYHISTOGRAM']._serialized_end=572
+  _globals['_STATSRESPONSE']._serialized_start=575
+  _globals['_STATSRESPONSE']._serialized_end=845
+  _globals['_STATSRESPONSE_COUNTERSENTRY']._serialized_start=751
+  _globals['_STATSRESPONSE_COUNTERSENTRY']._serialized_end=798
+  _globals['_STATSRESPONSE_GAUGESENTRY']._serialized_start=800
+  _globals['_STATSRESPONSE_GAUGESENTRY']._serialized_end=845
+  _globals['_BANK']._serialized_start=973
+  _globals['_BANK']._serialized_end=1269
 # @@protoc_insertion_point(module_scope)
@@ -1,24 +1,47 @@
+from google.protobuf.internal import containers as _containers
+from google.protobuf.internal import enum_type_wrapper as _enum_type_wrapper
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar as _ClassVar, Optional as _Optional
+from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
 
 DESCRIPTOR: _descriptor.FileDescriptor
 
+class Interface(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+    __slots__ = []
+    INTERFACE_UNSPECIFIED: _ClassVar[Interface]
+    QUERY: _ClassVar[Interface]
+    DEPOSIT: _ClassVar[Interface]
+    WITHDRAW: _ClassVar[Interface]
+    PROPAGATE_DEPOSIT: _ClassVar[Interface]
+    PROPAGATE_WITHDRAW: _ClassVar[Interface]
+INTERFACE_UNSPECIFIED: Interface
+QUERY: Interface
+DEPOSIT: Interface
+WITHDRAW: Interface
+PROPAGATE_DEPOSIT: Interface
+PROPAGATE_WITHDRAW: Interface
+
 class MsgDeliveryRequest(_message.Message):
-    __slots__ = ["id", "event_id", "interface", "money", "balance", "clock"]
+    __slots__ = ["id", "event_id", "interface", "money", "balance", "clock", "seq", "stale", "account"]
     ID_FIELD_NUMBER: _ClassVar[int]
     EVENT_ID_FIELD_NUMBER: _ClassVar[int]
     INTERFACE_FIELD_NUMBER: _ClassVar[int]
     MONEY_FIELD_NUMBER: _ClassVar[int]
     BALANCE_FIELD_NUMBER: _ClassVar[int]
     CLOCK_FIELD_NUMBER: _ClassVar[int]
+    SEQ_FIELD_NUMBER: _ClassVar[int]
+    STALE_FIELD_NUMBER: _ClassVar[int]
+    ACCOUNT_FIELD_NUMBER: _ClassVar[int]
     id: int
     event_id: int
-    interface: str
+    interface: Interface
     money: int
     balance: int
     clock: int
-    def __init__(self, id: _Optional[int] = ..., event_id: _Optional[int] = ..., interface: _Optional[str] = ..., money: _Optional[int] = ..., balance: _Optional[int] = ..., clock: _Optional[int] = ...) -> None: ...
+    seq: int
+    stale: bool
+    account: int
+    def __init__(self, id: _Optional[int] = ..., event_id: _Optional[int] = ..., interface: _Optional[_Union[Interface, str]] = ..., money: _Optional[int] = ..., balance: _Optional[int] = ..., clock: _Optional[int] = ..., seq: _Optional[int] = ..., stale: bool = ..., account: _Optional[int] = ...) -> None: ...
 
 class MsgDeliveryResponse(_message.Message):
     __slots__ = ["id", "event_id", "balance", "result", "clock"]
@@ -33,3 +56,71 @@ class MsgDeliveryResponse(_message.Message):
     result: str
     clock: int
     def __init__(self, id: _Optional[int] = ..., event_id: _Optional[int] = ..., balance: _Optional[int] = ..., result: _Optional[str] = ..., clock: _Optional[int] = ...) -> None: ...
+
+class MsgDeliveryBatchRequest(_message.Message):
+    __slots__ = ["id", "requests"]
+    ID_FIELD_NUMBER: _ClassVar[int]
+    REQUESTS_FIELD_NUMBER: _ClassVar[int]
+    id: int
+    requests: _containers.RepeatedCompositeFieldContainer[MsgDeliveryRequest]
+    def __init__(self, id: _Optional[int] = ..., requests: _Optional[_Iterable[_Union[MsgDeliveryRequest, _Mapping]]] = ...) -> None: ...
+
+class HealthRequest(_message.Message):
+    __slots__ = []
+    def __init__(self) -> None: ...
+
+class HealthResponse(_message.Message):
+    __slots__ = ["id", "ready", "peers"]
+    ID_FIELD_NUMBER: _ClassVar[int]
+    READY_FIELD_NUMBER: _ClassVar[int]
+    PEERS_FIELD_NUMBER: _ClassVar[int]
+    id: int
+    ready: bool
+    peers: int
+    def __init__(self, id: _Optional[int] = ..., ready: bool = ..., peers: _Optional[int] = ...) -> None: ...
+
+class StatsRequest(_message.Message):
+    __slots__ = []
+    def __init__(self) -> None: ...
+
+class LatencyHistogram(_message.Message):
+    __slots__ = ["name", "count", "total_us", "max_us", "buckets"]
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    COUNT_FIELD_NUMBER: _ClassVar[int]
+    TOTAL_US_FIELD_NUMBER: _ClassVar[int]
+    MAX_US_FIELD_NUMBER: _ClassVar[int]
+    BUCKETS_FIELD_NUMBER: _ClassVar[int]
+    name: str
+    count: int
+    total_us: float
+    max_us: float
+    buckets: _containers.RepeatedScalarFieldContainer[int]
+    def __init__(self, name: _Optional[str] = ..., count: _Optional[int] = ..., total_us: _Optional[float] = ..., max_us: _Optional[float] = ..., buckets: _Optional[_Iterable[int]] = ...) -> None: ...
+
+class StatsResponse(_message.Message):
+    __slots__ = ["id", "enabled", "counters", "gauges", "latencies"]
+    class CountersEntry(_message.Message):
+        __slots__ = ["key", "value"]
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: int
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[int] = ...) -> None: ...
+    class GaugesEntry(_message.Message):
+        __slots__ = ["key", "value"]
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: int
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[int] = ...) -> None: ...
+    ID_FIELD_NUMBER: _ClassVar[int]
+    ENABLED_FIELD_NUMBER: _ClassVar[int]
+    COUNTERS_FIELD_NUMBER: _ClassVar[int]
+    GAUGES_FIELD_NUMBER: _ClassVar[int]
+    LATENCIES_FIELD_NUMBER: _ClassVar[int]
+    id: int
+    enabled: bool
+    counters: _containers.ScalarMap[str, int]
+    gauges: _containers.ScalarMap[str, int]
+    latencies: _containers.RepeatedCompositeFieldContainer[LatencyHistogram]
+    def __init__(self, id: _Optional[int] = ..., enabled: bool = ..., counters: _Optional[_Mapping[str, int]] = ..., gauges: _Optional[_Mapping[str, int]] = ..., latencies: _Optional[_Iterable[_Union[LatencyHistogram, _Mapping]]] = ...) -> None: ...
@@ -19,6 +19,26 @@ class BankStub(object):
                 request_serializer=bank__pb2.MsgDeliveryRequest.SerializeToString,
                 response_deserializer=bank__pb2.MsgDeliveryResponse.FromString,
                 )
+        self.MsgDeliveryBatch = channel.unary_unary(
+                '/Bank/MsgDeliveryBatch',
+                request_serializer=bank__pb2.MsgDeliveryBatchRequest.SerializeToString,
+                response_deserializer=bank__pb2.MsgDeliveryResponse.FromString,
+                )
+        self.MsgDeliveryStream = channel.stream_stream(
+                '/Bank/MsgDeliveryStream',
+                request_serializer=bank__pb2.MsgDeliveryRequest.SerializeToString,
+                response_deserializer=bank__pb2.MsgDeliveryResponse.FromString,
+                )
+        self.Health = channel.unary_unary(
+                '/Bank/Health',
+                request_serializer=bank__pb2.HealthRequest.SerializeToString,
+                response_deserializer=bank__pb2.HealthResponse.FromString,
+                )
+        self.GetStats = channel.unary_unary(
+                '/Bank/GetStats',
+                request_serializer=bank__pb2.StatsRequest.SerializeToString,
+                response_deserializer=bank__pb2.StatsResponse.FromString,
+                )
 
 
 class BankServicer(object):
@@ -30,6 +50,35 @@ class BankServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def MsgDeliveryBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def MsgDeliveryStream(self, request_iterator, context):
+        """Same as MsgDelivery, pipelined over one stream. Responses come back in
+        request order.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Health(self, request, context):
+        """Ready once the branch has connected to all of its peers.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetStats(self, request, context):
+        """Counters, latency histograms and gauges, when the branch runs with
+        --metrics.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_BankServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -38,6 +87,26 @@ def add_BankServicer_to_server(servicer, server):
                     request_deserializer=bank__pb2.MsgDeliveryRequest.FromString,
                     response_serializer=bank__pb2.MsgDeliveryResponse.SerializeToString,
             ),
+            'MsgDeliveryBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.MsgDeliveryBatch,
+                    request_deserializer=bank__pb2.MsgDeliveryBatchRequest.FromString,
+                    response_serializer=bank__pb2.MsgDeliveryResponse.SerializeToString,
+            ),
+            'MsgDeliveryStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.MsgDeliveryStream,
+                    request_deserializer=bank__pb2.MsgDeliveryRequest.FromString,
+                    response_serializer=bank__pb2.MsgDeliveryResponse.SerializeToString,
+            ),
+            'Health': grpc.unary_unary_rpc_method_handler(
+                    servicer.Health,
+                    request_deserializer=bank__pb2.HealthRequest.FromString,
+                    response_serializer=bank__pb2.HealthResponse.SerializeToString,
+            ),
+            'GetStats': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetStats,
+                    request_deserializer=bank__pb2.StatsRequest.FromString,
+                    response_serializer=bank__pb2.StatsResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'Bank', rpc_method_handlers)
@@ -64,3 +133,71 @@ class Bank(object):
             bank__pb2.MsgDeliveryResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def MsgDeliveryBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/Bank/MsgDeliveryBatch',
+            bank__pb2.MsgDeliveryBatchRequest.SerializeToString,
+            bank__pb2.MsgDeliveryResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def MsgDeliveryStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/Bank/MsgDeliveryStream',
+            bank__pb2.MsgDeliveryRequest.SerializeToString,
+            bank__pb2.MsgDeliveryResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def Health(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/Bank/Health',
+            bank__pb2.HealthRequest.SerializeToString,
+            bank__pb2.HealthResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def GetStats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/Bank/GetStats',
+            bank__pb2.StatsRequest.SerializeToString,
+            bank__pb2.StatsResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
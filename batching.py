@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import bank_pb2
+
+
+class PeerQueue:
+    # Outbound propagation queue for one peer. Requests that arrive within
+    # `window` seconds of the first queued one (or until `max_batch` of them
+    # pile up) go out together in a single MsgDeliveryBatch call. With
+    # `metrics`, each batch's round trip is recorded under `name`.
+    def __init__(self, stub, sender_id, window=0.001, max_batch=64, metrics=None, name=None):
+        self.stub = stub
+        self.sender_id = sender_id
+        self.window = window
+        self.max_batch = max_batch
+        self.metrics = metrics
+        self.name = name
+        self.pending = []
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, request):
+        future = Future()
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("peer queue is closed")
+            self.pending.append((request, future))
+            self.cond.notify()
+        return future
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    return
+                deadline = time.monotonic() + self.window
+                while len(self.pending) < self.max_batch and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                batch = self.pending[:self.max_batch]
+                del self.pending[:self.max_batch]
+            self.send(batch)
+
+    def send(self, batch):
+        # The receiver applies the requests in order.
+        if self.metrics is not None:
+            acked = self.metrics.timer(self.name)
+        try:
+            response = self.stub.MsgDeliveryBatch(bank_pb2.MsgDeliveryBatchRequest(
+                id=self.sender_id, requests=[request for request, _ in batch]))
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        if self.metrics is not None:
+            acked()
+            self.metrics.count("batch.sent")
+        for _, future in batch:
+            future.set_result(response)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
@@ -0,0 +1,83 @@
+import argparse
+import contextlib
+import io
+import threading
+import time
+import tracemalloc
+
+import common
+import bank_pb2
+from accounts import AccountTable
+from branch import Branch
+from local_transport import LocalTransport, create_local_branches
+
+
+class DelayedBranch(Branch):
+    # Stands in for network round-trip time between hosts; the sleep lets
+    # other threads run, as waiting on a socket would.
+    delay = 0.0
+
+    def MsgDelivery(self, request, context):
+        if request.interface in (bank_pb2.PROPAGATE_DEPOSIT, bank_pb2.PROPAGATE_WITHDRAW):
+            time.sleep(self.delay)
+        return super().MsgDelivery(request, context)
+
+
+def table_bytes(count, shards):
+    # Memory held by a table after touching accounts 0..count-1.
+    tracemalloc.start()
+    table = AccountTable(0, shards)
+    for account in range(count):
+        table.set(account, account)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+def measure(branch_count, accounts, shards, clients, requests, delay):
+    # Requests per second from `clients` threads depositing into branch 1,
+    # in process, with sequential propagation of absolute balances.
+    DelayedBranch.delay = delay
+    with common.scratch_dir(), contextlib.redirect_stdout(io.StringIO()):
+        transport = LocalTransport()
+        branches = create_local_branches(common.make_branches(branch_count), transport, branch_class=DelayedBranch,
+                                         shards=shards, log_flush_every=0)
+        stub = transport.stub(next(iter(transport.servicers)))
+
+        def client(c):
+            for i in range(requests):
+                stub.MsgDelivery(bank_pb2.MsgDeliveryRequest(id=c, event_id=c * requests + i, money=1,
+                                                             account=(c * requests + i) % accounts,
+                                                             interface=bank_pb2.DEPOSIT))
+
+        threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        for branch in branches:
+            branch.close()
+    return clients * requests / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Account table memory, and deposit throughput over many accounts.")
+    parser.add_argument("--table-accounts", type=int, nargs="+", default=[10 ** 5, 10 ** 6])
+    parser.add_argument("--branches", type=int, default=3)
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1, 4, 16, 1000])
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50, help="deposits per client")
+    parser.add_argument("--delay-ms", type=float, default=2.0, help="added to every propagation")
+    args = parser.parse_args()
+    print(f"{'accounts':>9} {'MB':>7} {'bytes/account':>14}")
+    for count in args.table_accounts:
+        size = table_bytes(count, args.shards)
+        print(f"{count:>9} {size / 2 ** 20:>7.1f} {size / count:>14.1f}")
+    print()
+    print(f"{'accounts':>9} {'req/s':>8}")
+    for accounts in args.accounts:
+        rate = measure(args.branches, accounts, args.shards, args.clients, args.requests, args.delay_ms / 1000)
+        print(f"{accounts:>9} {rate:>8.0f}")
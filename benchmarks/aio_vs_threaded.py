@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import multiprocessing
+import random
+import time
+
+import common
+import grpc
+import bank_pb2
+import bank_pb2_grpc
+from aio_branch import create_aio_servers
+from branch import create_grpc_servers
+
+
+def serve(server_kind, branches, ready, stop):
+    # All branches share one process, as with `python branch.py`; the driver
+    # runs in the parent so it does not compete for the servers' GIL.
+    with common.scratch_dir():
+        if server_kind == "threaded":
+            servers, servicers = create_grpc_servers(branches)
+            ready.set()
+            stop.wait()
+            for server in servers:
+                server.stop(None)
+            for branch in servicers:
+                branch.close()
+        else:
+            async def run():
+                servers, servicers = await create_aio_servers(branches)
+                ready.set()
+                await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+                for server in servers:
+                    await server.stop(None)
+                for branch in servicers:
+                    await branch.closeAsync()
+            asyncio.run(run())
+
+
+async def drive(branch_count, customers, requests, timeout):
+    channels = [grpc.aio.insecure_channel(f"localhost:{50051 + i}") for i in range(1, branch_count + 1)]
+    stubs = [bank_pb2_grpc.BankStub(channel) for channel in channels]
+    latencies = []
+    errors = []
+
+    async def customer(c):
+        rng = random.Random(c)
+        stub = stubs[c % branch_count]
+        for r in range(requests):
+            interface = bank_pb2.DEPOSIT if rng.random() < 0.6 else bank_pb2.WITHDRAW
+            start = time.perf_counter()
+            try:
+                await stub.MsgDelivery(bank_pb2.MsgDeliveryRequest(
+                    id=c, event_id=c * requests + r, interface=interface, money=rng.randint(1, 10), clock=r + 1),
+                    timeout=timeout)
+            except grpc.RpcError as error:
+                errors.append(error.code())
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(customer(c) for c in range(customers)))
+    elapsed = time.perf_counter() - start
+    for channel in channels:
+        await channel.close()
+    return latencies, errors, elapsed
+
+
+def measure(server_kind, branch_count, customers, requests, timeout):
+    ready = multiprocessing.Event()
+    stop = multiprocessing.Event()
+    process = multiprocessing.Process(target=serve, args=(server_kind, common.make_branches(branch_count, 10000), ready, stop))
+    process.start()
+    ready.wait()
+    try:
+        latencies, errors, elapsed = asyncio.run(drive(branch_count, customers, requests, timeout))
+    finally:
+        stop.set()
+        process.join(10)
+        if process.is_alive():
+            process.kill()
+    stats = common.summarize(latencies)
+    stats["rps"] = len(latencies) / elapsed
+    stats["errors"] = len(errors)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--branches", type=int, default=5)
+    parser.add_argument("--customers", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--requests", type=int, default=20, help="requests per customer")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request deadline in seconds")
+    args = parser.parse_args()
+
+    rows = []
+    for customers in args.customers:
+        for server_kind in ("threaded", "aio"):
+            rows.append((customers, server_kind, measure(server_kind, args.branches, customers, args.requests, args.timeout)))
+
+    print(f"\n{'customers':>9} {'server':>9} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for customers, server_kind, stats in rows:
+        print(f"{customers:>9} {server_kind:>9} {stats['rps']:>8.0f} {stats['p50']:>9.1f} "
+              f"{stats['p99']:>9.1f} {stats['errors']:>7}")
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples) if samples else 0.0,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
+
+
+def make_branches(count, balance=400):
+    return [{"id": i, "type": "branch", "balance": balance} for i in range(1, count + 1)]
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    # Branches write their logs under ./output, keep that away from the repo.
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as path:
+        os.makedirs(os.path.join(path, "output"))
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            os.chdir(cwd)
@@ -0,0 +1,38 @@
+import argparse
+import time
+
+import common
+import bank_pb2
+from branch import Branch
+
+
+def measure(interface, calls, repeats, stale=False):
+    # Per-call cost of Branch.MsgDelivery without gRPC: dispatch, the
+    # handler and building the response. The branch has no peers, so
+    # deposits and withdrawals propagate to nobody, and its log is only
+    # written on close.
+    best = None
+    with common.scratch_dir():
+        for _ in range(repeats):
+            branch = Branch(1, 10 ** 9, [1], log_flush_every=0)
+            requests = [bank_pb2.MsgDeliveryRequest(id=1, event_id=i, interface=interface, money=1,
+                                                    balance=10 ** 9, clock=i, stale=stale)
+                        for i in range(calls)]
+            start = time.perf_counter()
+            for request in requests:
+                branch.MsgDelivery(request, None)
+            elapsed = (time.perf_counter() - start) / calls * 1e6
+            best = elapsed if best is None else min(best, elapsed)
+            branch.close()
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time MsgDelivery per call for each interface, in process.")
+    parser.add_argument("--calls", type=int, default=50000)
+    parser.add_argument("--repeats", type=int, default=5, help="runs per interface, the fastest is reported")
+    args = parser.parse_args()
+    print(f"{'interface':>20} {'us/call':>8}")
+    print(f"{'query (stale)':>20} {measure(bank_pb2.QUERY, args.calls, args.repeats, stale=True):>8.2f}")
+    for name in ("QUERY", "DEPOSIT", "WITHDRAW", "PROPAGATE_DEPOSIT", "PROPAGATE_WITHDRAW"):
+        print(f"{name.lower():>20} {measure(bank_pb2.Interface.Value(name), args.calls, args.repeats):>8.2f}")
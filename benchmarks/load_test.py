@@ -0,0 +1,140 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import time
+from concurrent import futures
+
+import common
+import workload
+from branch import Branch, create_grpc_servers, stop_grpc_servers
+from channel_pool import BASE_PORT, branch_target, pool
+from customer import Customer, wait_for_branches
+
+
+class TimedBranch(Branch):
+    # Records how long each propagation takes to reach (a quorum of) the
+    # peers, from the first send to the last ack.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fanout = []
+
+    def propagate(self, ticket, outgoing):
+        start = time.perf_counter()
+        super().propagate(ticket, outgoing)
+        if outgoing:
+            self.fanout.append((time.perf_counter() - start) * 1000)
+
+
+class TimingStub:
+    def __init__(self, stub, samples):
+        self.stub = stub
+        self.samples = samples
+
+    def MsgDelivery(self, request, **kwargs):
+        start = time.perf_counter()
+        response = self.stub.MsgDelivery(request, **kwargs)
+        self.samples.append((time.perf_counter() - start) * 1000)
+        return response
+
+
+class TimedCustomer(Customer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def createStub(self):
+        return TimingStub(super().createStub(), self.latencies)
+
+
+def serve(group, peers, options, ready, stop, results):
+    with contextlib.redirect_stdout(io.StringIO()):
+        servers, servicers = create_grpc_servers(group, peers=peers, branch_class=TimedBranch, **options)
+    ready.put([branch["id"] for branch in group])
+    stop.wait()
+    results.put([sample for branch in servicers for sample in branch.fanout])
+    stop_grpc_servers(servers, servicers)
+
+
+def measure(records, processes, base_port, **options):
+    branches = [record for record in records if record["type"] == "branch"]
+    customers = {}
+    for record in records:
+        if record["type"] == "customer":
+            if record["id"] not in customers:
+                customers[record["id"]] = TimedCustomer(record["id"], record["customer-requests"], base_port=base_port)
+            else:
+                customers[record["id"]].appendEvents(record["customer-requests"])
+
+    with common.scratch_dir():
+        size = -(-len(branches) // processes)
+        groups = [branches[i:i + size] for i in range(0, len(branches), size)]
+        peers = [branch["id"] for branch in branches]
+        context = multiprocessing.get_context("spawn")
+        ready, results = context.Queue(), context.Queue()
+        stop = context.Event()
+        children = [context.Process(target=serve, args=(group, peers, dict(options, base_port=base_port),
+                                                        ready, stop, results))
+                    for group in groups]
+        for child in children:
+            child.start()
+        try:
+            for _ in children:
+                ready.get(timeout=60)
+            unready = wait_for_branches([branch_target(id, base_port) for id in peers], 30)
+            if unready:
+                raise RuntimeError(f"branches not ready: {', '.join(unready)}")
+            start = time.perf_counter()
+            with futures.ThreadPoolExecutor(max_workers=len(customers)) as executor:
+                for future in [executor.submit(customer.executeEvents) for customer in customers.values()]:
+                    future.result()
+            elapsed = time.perf_counter() - start
+        finally:
+            stop.set()
+            fanout = []
+            for _ in children:
+                fanout.extend(results.get(timeout=30))
+            for child in children:
+                child.join(10)
+            pool.close()
+
+    latencies = [sample for customer in customers.values() for sample in customer.latencies]
+    return {
+        "requests": len(latencies),
+        "ops": len(latencies) / elapsed,
+        "latency": common.summarize(latencies),
+        "fanout": common.summarize(fanout),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a synthetic workload against local branches.")
+    parser.add_argument("--branches", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=10,
+                        help="customer records, spread over the branches by id")
+    parser.add_argument("--events", type=int, default=200, help="requests per customer record")
+    parser.add_argument("--deposit-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--propagation", nargs="+", choices=["sequential", "parallel", "batched"],
+                        default=["sequential", "parallel"])
+    parser.add_argument("--replication", choices=["absolute", "delta"], default="absolute")
+    parser.add_argument("--processes", type=int, default=1, help="processes hosting the branches")
+    parser.add_argument("--max-workers", type=int, default=10)
+    parser.add_argument("--base-port", type=int, default=BASE_PORT)
+    args = parser.parse_args()
+
+    records = workload.generate(args.branches, args.customers, args.events, args.deposit_ratio,
+                                balance=10 ** 9, seed=args.seed)
+    rows = []
+    for propagation in args.propagation:
+        rows.append((propagation, measure(records, args.processes, args.base_port,
+                                          propagation=propagation, replication=args.replication,
+                                          max_workers=args.max_workers)))
+
+    print(f"\n{'mode':>10} {'requests':>9} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'fan-out p50':>12} {'p95':>8} {'p99':>8}")
+    for propagation, stats in rows:
+        latency, fanout = stats["latency"], stats["fanout"]
+        print(f"{propagation:>10} {stats['requests']:>9} {stats['ops']:>8.0f} {latency['p50']:>8.2f} "
+              f"{latency['p95']:>8.2f} {latency['p99']:>8.2f} {fanout['p50']:>12.2f} "
+              f"{fanout['p95']:>8.2f} {fanout['p99']:>8.2f}")
@@ -0,0 +1,84 @@
+import argparse
+import random
+import time
+
+import common
+from customer import index_by_request, merge_events
+
+
+def synthesize(branches, customers, requests, seed=0):
+    # Customer and flattened branch events shaped like a real run: each
+    # request is received by one branch, propagated to every other branch,
+    # and received there, with clocks interleaving across requests.
+    rng = random.Random(seed)
+    clocks = {b: 0 for b in range(1, branches + 1)}
+    customer_data = []
+    branch_logs = {b: [] for b in clocks}
+    request_id = 0
+    for c in range(1, customers + 1):
+        events = []
+        for r in range(requests):
+            request_id += 1
+            interface = rng.choice(["deposit", "withdraw"])
+            events.append({"customer-request-id": request_id, "interface": interface,
+                           "logical_clock": r + 1, "comment": f"event_sent from customer {c}"})
+            origin = (c - 1) % branches + 1
+            clocks[origin] = max(clocks[origin], r + 1) + 1
+            branch_logs[origin].append((request_id, clocks[origin], interface, f"event_recv from customer {c}"))
+            for peer in clocks:
+                if peer == origin:
+                    continue
+                clocks[origin] += 1
+                branch_logs[origin].append((request_id, clocks[origin], "propogate_" + interface, f"event_sent to branch {peer}"))
+                clocks[peer] = max(clocks[peer], clocks[origin]) + 1
+                branch_logs[peer].append((request_id, clocks[peer], "propogate_" + interface, f"event_recv from bank {origin}"))
+        customer_data.append({"id": c, "type": "customer", "events": events})
+    flattened = [{"id": b, "type": "branch", "customer-request-id": rid, "logical_clock": clock,
+                  "interface": interface, "comment": comment}
+                 for b, log in branch_logs.items() for rid, clock, interface, comment in log]
+    return customer_data, flattened
+
+
+def legacy_merge(customer_data, flattened_data):
+    all_events = []
+    for customer in customer_data:
+        for event in customer["events"]:
+            all_events.append({"id": customer["id"], "customer-request-id": event["customer-request-id"],
+                               "type": "customer", "logical_clock": event["logical_clock"],
+                               "interface": event["interface"], "comment": event["comment"]})
+            customer_request_id = event["customer-request-id"]
+            filtered = filter(lambda e: e["customer-request-id"] == customer_request_id, flattened_data)
+            all_events.extend(sorted(filtered, key=lambda e: e["logical_clock"]))
+    return all_events
+
+
+def indexed_merge(customer_data, flattened_data):
+    return merge_events(customer_data, index_by_request(flattened_data))
+
+
+def timed(merge, customer_data, flattened):
+    start = time.perf_counter()
+    result = merge(customer_data, flattened)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--branches", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=60, help="requests per customer")
+    parser.add_argument("--legacy-customers", type=int, default=10,
+                        help="customers in the smaller run that is also timed with the old filter/sort merge")
+    args = parser.parse_args()
+
+    small = synthesize(args.branches, args.legacy_customers, args.requests)
+    old, old_time = timed(legacy_merge, *small)
+    new, new_time = timed(indexed_merge, *small)
+    print(f"{len(small[1]):>9} branch events: legacy {old_time:8.3f}s  indexed {new_time:8.3f}s  "
+          f"identical={old == new}")
+
+    large = synthesize(args.branches, args.customers, args.requests)
+    _, large_time = timed(indexed_merge, *large)
+    scale = len(large[1]) / len(small[1])
+    print(f"{len(large[1]):>9} branch events: legacy ~{old_time * scale * scale:7.0f}s (extrapolated, quadratic)  "
+          f"indexed {large_time:8.3f}s")
@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import time
+
+import grpc
+import common
+import bank_pb2
+from branch import create_grpc_servers, stop_grpc_servers
+from channel_pool import BASE_PORT, ChannelPool, branch_target, pool
+from customer import Customer, wait_for_branches
+
+
+def serve(branches, options, ready, stop):
+    with contextlib.redirect_stdout(io.StringIO()):
+        servers, servicers = create_grpc_servers(branches, **options)
+    ready.put(True)
+    stop.wait()
+    stop_grpc_servers(servers, servicers)
+
+
+async def offer(customer, rate, seconds):
+    # Open loop: deposits arrive at `rate` per second whether or not earlier
+    # ones have finished, each sent as its own coroutine with the customer's
+    # retry policy.
+    channels = ChannelPool(aio=True)
+    stub = channels.stub(customer.target)
+    latencies, failed = [], []
+
+    async def send(i, due):
+        try:
+            await customer.callAsync(stub, bank_pb2.MsgDeliveryRequest(id=1, event_id=i, interface=bank_pb2.DEPOSIT,
+                                                                       money=1, clock=i))
+            latencies.append((time.perf_counter() - due) * 1000)
+        except grpc.RpcError:
+            failed.append(i)
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        due = start + i / rate
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        tasks.append(asyncio.ensure_future(send(i, due)))
+    await asyncio.gather(*tasks)
+    await channels.closeAsync()
+    return latencies, failed
+
+
+def measure(branch_count, rate, seconds, retries, base_port, **options):
+    # Offers branch 1 deposits at `rate` per second. Returns the latencies
+    # (ms, from when each was due, retries included) of the requests that
+    # succeeded, how many failed and how many retries were sent.
+    with common.scratch_dir():
+        branches = common.make_branches(branch_count, 10 ** 9)
+        context = multiprocessing.get_context("spawn")
+        ready, stop = context.Queue(), context.Event()
+        child = context.Process(target=serve, args=(branches, dict(options, base_port=base_port), ready, stop))
+        child.start()
+        try:
+            ready.get(timeout=60)
+            wait_for_branches([branch_target(branch["id"], base_port) for branch in branches], 30)
+            customer = Customer(1, [], base_port=base_port, retries=retries)
+            latencies, failed = asyncio.run(offer(customer, rate, seconds))
+        finally:
+            stop.set()
+            child.join(10)
+            pool.close()
+    return latencies, len(failed), customer.retried
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offer branch 1 more deposits than it can serve, "
+                                                 "with and without admission control.")
+    parser.add_argument("--branches", type=int, default=3)
+    parser.add_argument("--rate", type=float, nargs="+", default=[200, 800], help="deposits offered per second")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--admission-limit", type=int, nargs="+", default=[0, 8],
+                        help="branch admission limits to compare (0: no admission control)")
+    parser.add_argument("--retries", type=int, default=8, help="customer retries after a rejection")
+    parser.add_argument("--max-workers", type=int, default=10)
+    parser.add_argument("--base-port", type=int, default=BASE_PORT)
+    args = parser.parse_args()
+    print(f"{'offered/s':>10} {'admission':>9} {'served/s':>9} {'failed':>7} {'retried':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for rate in args.rate:
+        for limit in args.admission_limit:
+            latencies, failed, retried = measure(args.branches, rate, args.seconds, args.retries,
+                                                 args.base_port, max_workers=args.max_workers,
+                                                 admission_limit=limit)
+            stats = common.summarize(latencies)
+            print(f"{rate:>10.0f} {limit or 'off':>9} {len(latencies) / args.seconds:>9.0f} {failed:>7} "
+                  f"{retried:>8} {stats['p50']:>8.1f} {stats['p99']:>8.1f} {max(latencies, default=0):>8.1f}")
@@ -0,0 +1,85 @@
+import argparse
+import multiprocessing
+import time
+from concurrent import futures
+
+import common
+import grpc
+import bank_pb2
+import bank_pb2_grpc
+from branch import Branch
+
+
+class DelayedBranch(Branch):
+    # Stands in for network round-trip time between hosts.
+    delay = 0.0
+
+    def MsgDelivery(self, request, context):
+        if request.interface in (bank_pb2.PROPAGATE_DEPOSIT, bank_pb2.PROPAGATE_WITHDRAW):
+            time.sleep(self.delay)
+        return super().MsgDelivery(request, context)
+
+
+def serve_branch(branch, ids, propagation, quorum, delay, ready, stop):
+    # One process per branch, so peers handle propagation on separate GILs.
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    servicer = DelayedBranch(branch["id"], branch["balance"], ids, propagation, quorum)
+    servicer.delay = delay
+    bank_pb2_grpc.add_BankServicer_to_server(servicer, server)
+    server.add_insecure_port(f"[::]:{50051 + branch['id']}")
+    server.start()
+    ready.release()
+    stop.wait()
+    server.stop(0)
+
+
+def measure(branch_count, propagation, quorum, delay, requests):
+    with common.scratch_dir():
+        branches = common.make_branches(branch_count)
+        ids = [branch["id"] for branch in branches]
+        ready = multiprocessing.Semaphore(0)
+        stop = multiprocessing.Event()
+        processes = [multiprocessing.Process(target=serve_branch, args=(branch, ids, propagation, quorum, delay, ready, stop))
+                     for branch in branches]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.acquire()
+        try:
+            channel = grpc.insecure_channel("localhost:50052")
+            stub = bank_pb2_grpc.BankStub(channel)
+            samples = []
+            for i in range(requests):
+                interface = bank_pb2.DEPOSIT if i % 2 == 0 else bank_pb2.WITHDRAW
+                start = time.perf_counter()
+                stub.MsgDelivery(bank_pb2.MsgDeliveryRequest(
+                    id=1, event_id=i, interface=interface, money=1, clock=i))
+                samples.append((time.perf_counter() - start) * 1000)
+            channel.close()
+        finally:
+            stop.set()
+            for process in processes:
+                process.join()
+    # The first request pays for channel setup to every peer.
+    return common.summarize(samples[1:])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--branches", type=int, nargs="+", default=[5, 20, 50])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--quorum", type=int, default=None)
+    parser.add_argument("--delay-ms", type=float, default=0.0,
+                        help="simulated one-way delay added to every propagation message")
+    args = parser.parse_args()
+
+    rows = []
+    for count in args.branches:
+        for propagation in ("sequential", "parallel"):
+            stats = measure(count, propagation, args.quorum, args.delay_ms / 1000, args.requests)
+            rows.append((count, propagation, stats))
+
+    print(f"\n{'branches':>8} {'mode':>10} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for count, propagation, stats in rows:
+        print(f"{count:>8} {propagation:>10} {stats['mean']:>9.2f} {stats['p50']:>8.2f} "
+              f"{stats['p95']:>8.2f} {stats['p99']:>8.2f}")
@@ -0,0 +1,64 @@
+import argparse
+import contextlib
+import io
+import threading
+import time
+
+import common
+import bank_pb2
+from local_transport import LocalTransport, create_local_branches
+
+
+def measure(mode, branch_count, readers, reads, writers, writes, data_dir=None):
+    # Readers query branch 1 while writers deposit there, all in process,
+    # each thread a fixed number of times. Returns the seconds until all
+    # are done and the read latencies in us.
+    with common.scratch_dir(), contextlib.redirect_stdout(io.StringIO()):
+        transport = LocalTransport()
+        branches = create_local_branches(common.make_branches(branch_count, 10 ** 9), transport,
+                                         data_dir=data_dir, wal_fsync=False)
+        stub = transport.stub(next(iter(transport.servicers)))
+        latencies = [[] for _ in range(readers)]
+
+        def read(r):
+            request = bank_pb2.MsgDeliveryRequest(id=1, interface=bank_pb2.QUERY, stale=mode == "stale")
+            samples = latencies[r]
+            for _ in range(reads):
+                start = time.perf_counter()
+                stub.MsgDelivery(request)
+                samples.append((time.perf_counter() - start) * 1e6)
+
+        def write(w):
+            for i in range(writes):
+                stub.MsgDelivery(bank_pb2.MsgDeliveryRequest(id=1, event_id=w * writes + i,
+                                                             interface=bank_pb2.DEPOSIT, money=1))
+
+        threads = ([threading.Thread(target=read, args=(r,)) for r in range(readers)] +
+                   [threading.Thread(target=write, args=(w,)) for w in range(writers)])
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        for branch in branches:
+            branch.close()
+    samples = [sample for thread_samples in latencies for sample in thread_samples]
+    return elapsed, samples
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query throughput and latency next to a stream of deposits.")
+    parser.add_argument("--branches", type=int, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--reads", type=int, default=50000, help="queries per reader")
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--writes", type=int, default=2000, help="deposits per writer")
+    parser.add_argument("--data-dir", default=None, help="give the branches a WAL here (relative to a scratch dir)")
+    args = parser.parse_args()
+    print(f"{'queries':>8} {'seconds':>8} {'read p50 us':>12} {'p99 us':>8}")
+    for mode in ("strict", "stale"):
+        elapsed, samples = measure(mode, args.branches, args.readers, args.reads, args.writers, args.writes,
+                                   args.data_dir)
+        stats = common.summarize(samples)
+        print(f"{mode:>8} {elapsed:>8.2f} {stats['p50']:>12.1f} {stats['p99']:>8.1f}")
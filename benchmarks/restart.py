@@ -0,0 +1,83 @@
+import argparse
+import gc
+import os
+import threading
+import time
+
+import common
+import bank_pb2
+from branch import Branch
+
+
+def fill(records, snapshot_every, fsync=False):
+    # One branch without peers takes `records` deposits and withdrawals,
+    # then shuts down; its WAL and snapshot stay in ./wal.
+    branch = Branch(1, 10 ** 9, [1], log_flush_every=0, data_dir="wal",
+                    snapshot_every=snapshot_every, wal_fsync=fsync)
+    for i in range(records):
+        interface = bank_pb2.DEPOSIT if i % 2 else bank_pb2.WITHDRAW
+        branch.MsgDelivery(bank_pb2.MsgDeliveryRequest(id=1, event_id=i, interface=interface, money=i % 7 + 1,
+                                                       clock=i), None)
+    state = (branch.balance, branch.clock)
+    branch.close()
+    return state
+
+
+def measure_restart(records, snapshot_every):
+    with common.scratch_dir():
+        expected = fill(records, snapshot_every)
+        size = sum(os.path.getsize(os.path.join("wal", name)) for name in os.listdir("wal"))
+        # Only time the WAL: not collecting the filled branch, nor truncating
+        # the event log it wrote.
+        gc.collect()
+        os.remove(os.path.join("output", "branch-1.jsonl"))
+        start = time.perf_counter()
+        branch = Branch(1, 0, [1], log_flush_every=0, data_dir="wal", snapshot_every=snapshot_every)
+        elapsed = time.perf_counter() - start
+        if (branch.balance, branch.clock) != expected:
+            raise RuntimeError(f"recovered {(branch.balance, branch.clock)}, expected {expected}")
+        branch.close()
+    return size, elapsed * 1000
+
+
+def measure_group_commit(threads, requests):
+    # Concurrent deposits with fsync on; commits < records means fsyncs
+    # were shared.
+    with common.scratch_dir():
+        branch = Branch(1, 0, [1], log_flush_every=0, data_dir="wal", metrics=True)
+
+        def run(t):
+            for i in range(requests):
+                branch.MsgDelivery(bank_pb2.MsgDeliveryRequest(id=t, event_id=i, interface=bank_pb2.DEPOSIT,
+                                                               money=1, clock=i), None)
+        workers = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        commits = branch.metrics.counters.get("wal.commits", 0)
+        branch.close()
+    return threads * requests / elapsed, threads * requests / max(commits, 1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time branch restarts from the WAL, and group commit under load.")
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--snapshot-every", type=int, nargs="+", default=[0, 10000], help="0: never")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="fsynced requests per thread")
+    args = parser.parse_args()
+
+    print(f"{'records':>9} {'snapshot every':>15} {'on disk KB':>11} {'restart ms':>11}")
+    for records in args.records:
+        for snapshot_every in args.snapshot_every:
+            size, elapsed = measure_restart(records, snapshot_every)
+            every = snapshot_every or "never"
+            print(f"{records:>9} {every:>15} {size / 1024:>11.1f} {elapsed:>11.2f}")
+
+    print(f"\n{'threads':>9} {'req/s':>9} {'records/fsync':>14}")
+    for threads in args.threads:
+        ops, batching = measure_group_commit(threads, args.requests)
+        print(f"{threads:>9} {ops:>9.0f} {batching:>14.1f}")
@@ -0,0 +1,63 @@
+import argparse
+import contextlib
+import io
+import time
+
+import common
+import workload
+from branch import create_grpc_servers, stop_grpc_servers
+from channel_pool import BASE_PORT
+from customer import Customer
+from driver import run_threaded
+from local_transport import LocalTransport, create_local_branches
+
+
+def customers(records, base_port, pool=None):
+    by_id = {}
+    for record in records:
+        if record["type"] == "customer":
+            if record["id"] not in by_id:
+                by_id[record["id"]] = Customer(record["id"], record["customer-requests"], base_port=base_port,
+                                               pool=pool)
+            else:
+                by_id[record["id"]].appendEvents(record["customer-requests"])
+    return list(by_id.values())
+
+
+def measure(records, transport, workers, base_port):
+    # Seconds for every customer to finish, branches hosted in this process.
+    branches = [record for record in records if record["type"] == "branch"]
+    with common.scratch_dir(), contextlib.redirect_stdout(io.StringIO()):
+        if transport == "local":
+            pool = LocalTransport()
+            servicers = create_local_branches(branches, pool, base_port)
+        else:
+            pool = None
+            servers, servicers = create_grpc_servers(branches, base_port=base_port)
+        start = time.perf_counter()
+        run_threaded(iter(customers(records, base_port, pool)), workers, lambda result: None)
+        elapsed = time.perf_counter() - start
+        if transport == "local":
+            for branch in servicers:
+                branch.close()
+        else:
+            stop_grpc_servers(servers, servicers)
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare gRPC and in-process calls between branches and customers.")
+    parser.add_argument("--branches", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--customers", type=int, default=20)
+    parser.add_argument("--events", type=int, default=100, help="requests per customer record")
+    parser.add_argument("--workers", type=int, default=8, help="customers running at once")
+    parser.add_argument("--base-port", type=int, default=BASE_PORT)
+    args = parser.parse_args()
+    print(f"{'branches':>9} {'requests':>9} {'grpc req/s':>11} {'local req/s':>12} {'speedup':>8}")
+    for branch_count in args.branches:
+        records = workload.generate(branch_count, args.customers, args.events, balance=10 ** 9)
+        requests = args.customers * args.events
+        grpc_time = measure(records, "grpc", args.workers, args.base_port)
+        local_time = measure(records, "local", args.workers, args.base_port)
+        print(f"{branch_count:>9} {requests:>9} {requests / grpc_time:>11.0f} {requests / local_time:>12.0f} "
+              f"{grpc_time / local_time:>7.1f}x")
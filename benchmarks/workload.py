@@ -0,0 +1,62 @@
+import argparse
+import json
+import random
+
+import common
+
+
+def generate(branches, customers, events, deposit_ratio=0.5, balance=400, max_money=100, seed=0, query_ratio=0.0,
+             accounts=1):
+    # Records in the inputs/input.json layout: customers first, then
+    # branches. A customer talks to the branch with its id, so customer
+    # records cycle over the branch ids; request ids are unique overall.
+    # With more than one account, each request picks one at random.
+    rng = random.Random(seed)
+    records = []
+    request_id = 0
+    for c in range(customers):
+        requests = []
+        for _ in range(events):
+            request_id += 1
+            account = {"account": rng.randrange(accounts)} if accounts > 1 else {}
+            if query_ratio and rng.random() < query_ratio:
+                requests.append({"customer-request-id": request_id, "interface": "query", **account})
+                continue
+            interface = "deposit" if rng.random() < deposit_ratio else "withdraw"
+            requests.append({"customer-request-id": request_id, "interface": interface,
+                             "money": rng.randint(1, max_money), **account})
+        records.append({"id": c % branches + 1, "type": "customer", "customer-requests": requests})
+    records.extend(common.make_branches(branches, balance))
+    return records
+
+
+def write_workload(records, path, ndjson=False):
+    with open(path, "w") as file:
+        if ndjson:
+            for record in records:
+                file.write(json.dumps(record))
+                file.write("\n")
+        else:
+            json.dump(records, file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a synthetic input file for branch.py and customer.py.")
+    parser.add_argument("output")
+    parser.add_argument("--branches", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=10,
+                        help="customer records, spread over the branches by id")
+    parser.add_argument("--events", type=int, default=100, help="requests per customer record")
+    parser.add_argument("--deposit-ratio", type=float, default=0.5,
+                        help="share of updates that are deposits, the rest are withdrawals")
+    parser.add_argument("--query-ratio", type=float, default=0.0, help="share of requests that are queries")
+    parser.add_argument("--balance", type=int, default=400, help="starting balance of every branch")
+    parser.add_argument("--accounts", type=int, default=1, help="accounts the requests are spread over")
+    parser.add_argument("--max-money", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ndjson", action="store_true", help="one record per line instead of a JSON array")
+    args = parser.parse_args()
+    records = generate(args.branches, args.customers, args.events, args.deposit_ratio,
+                       args.balance, args.max_money, args.seed, args.query_ratio, args.accounts)
+    write_workload(records, args.output, args.ndjson)
+    print(f"Wrote {args.customers * args.events} requests for {args.branches} branches to {args.output}")
@@ -1,200 +1,763 @@
 from concurrent import futures
+import argparse
+import asyncio
+import multiprocessing
+import queue
+import signal
 import sys
-import json
+import threading
+import time
+from collections import deque
 import grpc
 import bank_pb2
 import bank_pb2_grpc
 import os
+from accounts import AccountTable
+from admission import AdmissionLimiter, QueueTimingExecutor, queued_at
+from batching import PeerQueue
+from eventlog import EventLogWriter
+from events import EventStore, RECV_FROM_BANK, RECV_FROM_CUSTOMER, SENT_TO_BRANCH, render_event
+from loader import iter_records
+from metrics import Metrics, to_response
+from wal import ADD, INIT, SET, WriteAheadLog
+import channel_pool
+from channel_pool import BASE_PORT, SERVER_OPTIONS, branch_target
+
+# MsgDelivery handler and metrics name for each interface. A handler returns
+# the response plus the propagation to send once the lock is released
+# (ticket None when there is nothing to send).
+HANDLERS = {
+    bank_pb2.DEPOSIT: ("Deposit", "handle.deposit"),
+    bank_pb2.WITHDRAW: ("Withdraw", "handle.withdraw"),
+    bank_pb2.PROPAGATE_DEPOSIT: ("Propagate_Deposit", "handle.propagate_deposit"),
+    bank_pb2.PROPAGATE_WITHDRAW: ("Propagate_Withdraw", "handle.propagate_withdraw"),
+}
+# Reads only return the response and skip the write-side bookkeeping: no
+# request history, WAL commit or event log checkpoint.
+READ_HANDLERS = {
+    bank_pb2.QUERY: ("Query", "handle.query"),
+}
+# Interfaces customers send, which admission control may turn away. Peers'
+# propagations are always served: their sender has already applied them.
+ADMITTED = {bank_pb2.DEPOSIT, bank_pb2.WITHDRAW, bank_pb2.QUERY}
+# The event logs keep their original interface names.
+LOG_INTERFACES = {bank_pb2.PROPAGATE_DEPOSIT: "propogate_deposit", bank_pb2.PROPAGATE_WITHDRAW: "propogate_withdraw"}
+
+
+class Turnstile:
+    # Lets propagations of one account shard through to one peer in ticket
+    # order.
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.next = 0
+
+    def wait(self, ticket):
+        with self.cond:
+            self.cond.wait_for(lambda: self.next == ticket)
+
+    def advance(self, *args):
+        with self.cond:
+            self.next += 1
+            self.cond.notify_all()
+
+
+class Unordered:
+    # Turnstile stand-in for delta replication: deltas commute, so a peer
+    # may receive them in any order.
+    def wait(self, ticket):
+        pass
+
+    def advance(self, *args):
+        pass
 
 
 class Branch(bank_pb2_grpc.BankServicer):
-    def __init__(self, id, balance, branches):
+    # Propagation turns, one per peer and account shard. AioBranch swaps in
+    # the asyncio ones.
+    Turnstile = Turnstile
+    Unordered = Unordered
+
+    def __init__(self, id, balance, branches, propagation="sequential", quorum=None,
+                 batch_window=0.001, batch_size=64, log_flush_every=1, log_flush_interval=None,
+                 base_port=BASE_PORT, pool=None, recv_history=0, metrics=False, replication="absolute",
+                 data_dir=None, snapshot_every=10000, wal_fsync=True, shards=16, admission_limit=None):
         self.id = id
-        self.balance = balance
         self.branches = branches
+        self.propagation = propagation
+        self.quorum = quorum
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.base_port = base_port
+        self.pool = pool or channel_pool.pool
         self.branch_logs = {
             "id": id,
             "type": "branch",
-            "events": []
+            "events": EventStore()
         }
-        self.channelList = list()
         self.stubList = list()
         self.stubListBranchMapping = list()
-        self.recvMsg = list()
+        self.peerQueues = list()
+        self.peerTurns = list()
+        self.peersReady = False
+        self.ready = False
+        self.connectLock = threading.Lock()
+        # The last `recv_history` requests received, kept for debugging only.
+        self.recvMsg = deque(maxlen=recv_history)
         self.clock = 0
+        # Every account starts at `balance`. A shard's lock guards its
+        # accounts and propagation ticket; updates to accounts of different
+        # shards only share the short self.lock section and reach peers in
+        # independent orders, see propagate.
+        self.accounts = AccountTable(balance, shards)
+        # Guards the clock, the event log, the WAL and the delta versions.
+        # Taken inside a shard lock, never the other way round, and never
+        # held across an RPC.
+        self.lock = threading.Lock()
+        # With "delta" replication, propagations carry signed changes tagged
+        # with this branch's sequence number instead of the new balance.
+        # versions[origin] is the highest seq up to which every update from
+        # origin has been applied, ahead[origin] the ones applied past it.
+        self.replication = replication
+        self.seq = 0
+        self.versions = {}
+        self.ahead = {}
+        self.metrics = Metrics() if metrics else None
+        self.eventLog = EventLogWriter(os.path.join("output", f"branch-{id}.jsonl"),
+                                       log_flush_every, log_flush_interval, render=render_event,
+                                       metrics=self.metrics)
+        # Bound once here so MsgDelivery is a single lookup; subclasses that
+        # override a handler are picked up by name.
+        self.handlers = {interface: (getattr(self, method), name)
+                         for interface, (method, name) in HANDLERS.items()}
+        self.readHandlers = {interface: (getattr(self, method), name)
+                             for interface, (method, name) in READ_HANDLERS.items()}
+        # With `admission_limit`, at most that many customer requests are
+        # served at once, fewer while latency is up, see AdmissionLimiter.
+        # The rest get RESOURCE_EXHAUSTED before anything is applied, so
+        # customers can safely retry them.
+        self.limiter = None
+        if admission_limit:
+            self.limiter = AdmissionLimiter(admission_limit)
+            if self.metrics is not None:
+                self.metrics.gauge("admission.limit", lambda: int(self.limiter.limit))
+        # With `data_dir`, every update is logged there before it is
+        # acknowledged or propagated, and a restart picks up where the last
+        # run stopped instead of at `balance`.
+        self.wal = None
+        self.recovered = False
+        if data_dir is not None:
+            self.wal = WriteAheadLog(data_dir, id, wal_fsync, self.metrics)
+            self.snapshotEvery = snapshot_every
+            self.recovered = self.recover()
+            if not self.recovered:
+                # Later records are changes to this starting balance.
+                self.logUpdate(INIT, id, 0, balance, 0)
+                self.wal.commit()
+
+    @property
+    def balance(self):
+        return self.accounts.get(0)
+
+    def receive(self, request):
+        # Lamport receive rule, caller holds self.lock.
+        self.clock = max(self.clock, request.clock) + 1
+
+    def logEvent(self, event_id, interface, kind, peer):
+        # `kind` and `peer` make up the comment, see events.COMMENTS.
+        self.eventLog.append(self.branch_logs["events"].append(event_id, self.clock, interface, kind, peer))
+
+    def recover(self):
+        # Returns True if the WAL held state from an earlier run.
+        snapshot, records = self.wal.replay()
+        if snapshot is not None:
+            self.accounts, self.clock, self.seq = snapshot.accounts, snapshot.clock, snapshot.seq
+            self.versions, self.ahead = snapshot.versions, snapshot.ahead
+        for kind, origin, lsn, clock, amount, seq, account in records:
+            self.clock = clock
+            if kind == INIT:
+                self.accounts = AccountTable(amount, len(self.accounts.shards))
+            elif kind == SET:
+                self.accounts.set(account, amount)
+            elif origin == self.id or not seq or self.markApplied(origin, seq):
+                self.accounts.add(account, amount)
+            if seq and origin == self.id:
+                self.seq = self.versions[self.id] = seq
+        return snapshot is not None or bool(records)
+
+    def logUpdate(self, kind, origin, account, amount, seq):
+        # Caller holds self.lock and has applied the update.
+        if self.wal is not None:
+            self.wal.append(kind, origin, self.clock, amount, seq, account)
+
+    def commitUpdates(self):
+        # Makes the updates logged so far durable, then snapshots once
+        # enough have piled up. Called with no lock held.
+        wal = self.wal
+        if wal is not None:
+            wal.commit()
+            if self.snapshotEvery and wal.records >= self.snapshotEvery:
+                self.snapshot()
+
+    def snapshot(self):
+        # Every shard lock, in order, then self.lock: no update is half
+        # applied and the state matches the last record logged.
+        locks = [shard.lock for shard in self.accounts.shards] + [self.lock]
+        for lock in locks:
+            lock.acquire()
+        try:
+            self.wal.takeSnapshot(self.clock, self.seq, self.versions, self.ahead, self.accounts)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def close(self):
+        for peerQueue in self.peerQueues:
+            peerQueue.close()
+        self.eventLog.close()
+        if self.wal is not None:
+            self.wal.close()
 
     def Deposit(self, request):
-        self.branch_logs["events"].append({
-            "customer-request-id": request.event_id,
-            "logical_clock": self.clock,
-            "interface": "deposit",
-            "comment": f"event_recv from customer {request.id}"
-        })
-        self.balance += request.money
-        if len(self.channelList) == 0:
+        self.connectPeers()
+        account = request.account
+        shard = self.accounts.shard(account)
+        with shard.lock:
+            balance = self.accounts.get(account) + request.money
+            with self.lock:
+                self.receive(request)
+                self.logEvent(request.event_id, "deposit", RECV_FROM_CUSTOMER, request.id)
+                self.accounts.set(account, balance)
+                outgoing = self.preparePropagation(request, bank_pb2.PROPAGATE_DEPOSIT, request.money, balance)
+                self.logUpdate(ADD, self.id, account, request.money, self.seq)
+                clock = self.clock
+            ticket = shard.takeTicket()
+        return bank_pb2.MsgDeliveryResponse(id=self.id, event_id=request.event_id, result="success",
+                                            clock=clock), ticket, outgoing
+
+    def connectPeers(self):
+        if self.peersReady:
+            return
+        with self.connectLock:
+            if self.peersReady:
+                return
             for id in self.branches:
                 if id == self.id:
                     continue
-                port = 50051 + id
-                channel = grpc.insecure_channel(
-                    f"localhost:{port}")
-                self.channelList.append(channel)
-                stub = bank_pb2_grpc.BankStub(channel)
+                stub = self.pool.stub(branch_target(id, self.base_port))
                 self.stubList.append(stub)
                 self.stubListBranchMapping.append(id)
+                if self.replication == "absolute":
+                    self.peerTurns.append([self.Turnstile() for _ in self.accounts.shards])
+                else:
+                    self.peerTurns.append([self.Unordered()] * len(self.accounts.shards))
+                if self.propagation == "batched":
+                    peerQueue = PeerQueue(stub, self.id, self.batch_window, self.batch_size,
+                                          metrics=self.metrics, name=f"propagate.peer.{id}")
+                    self.peerQueues.append(peerQueue)
+                    if self.metrics is not None:
+                        self.metrics.gauge(f"queue.peer.{id}", lambda peerQueue=peerQueue: len(peerQueue.pending))
+            self.peersReady = True
+
+    def peerTargets(self):
+        return [branch_target(id, self.base_port) for id in self.branches if id != self.id]
+
+    def warmPeers(self, timeout=None):
+        # Connects to every peer ahead of the first deposit/withdraw. Health
+        # reports ready once this has succeeded.
+        self.connectPeers()
+        unready = self.pool.warm(self.peerTargets(), timeout)
+        if not unready:
+            self.ready = True
+        return unready
+
+    def Health(self, request, context):
+        return bank_pb2.HealthResponse(id=self.id, ready=self.ready, peers=len(self.stubList))
+
+    def GetStats(self, request, context):
+        return to_response(self.id, self.metrics)
+
+    def preparePropagation(self, request, interface, delta, balance):
+        # Caller holds self.lock. Each peer gets its clock in peer order and
+        # only the one account's new balance (or delta).
+        log_interface = LOG_INTERFACES[interface]
+        seq = 0
+        if self.replication == "delta":
+            self.seq += 1
+            seq = self.versions[self.id] = self.seq
+        outgoing = []
         for i in range(len(self.stubList)):
-            stub = self.stubList[i]
             recv_branch = self.stubListBranchMapping[i]
             self.clock += 1
-            self.branch_logs["events"].append({
-                "customer-request-id": request.event_id,
-                "logical_clock": self.clock,
-                "interface": "propogate_deposit",
-                "comment": f"event_sent to branch {recv_branch}"
-            })
-            stub.MsgDelivery(
-                bank_pb2.MsgDeliveryRequest(id=self.id, event_id=request.event_id, balance=self.balance, interface="propagatedeposit", clock=self.clock))
-        return {
-            "id": self.id,
-            "event_id": request.event_id,
-            "result": "success",
-            "clock": self.clock
-        }
+            self.logEvent(request.event_id, log_interface, SENT_TO_BRANCH, recv_branch)
+            outgoing.append(bank_pb2.MsgDeliveryRequest(id=self.id, event_id=request.event_id,
+                                                        balance=balance, money=delta, seq=seq,
+                                                        account=request.account, interface=interface,
+                                                        clock=self.clock))
+        return outgoing
+
+    def propagate(self, ticket, outgoing):
+        # Absolute balances of an account must reach every peer in update
+        # order. `ticket` is the account's shard and its place in that
+        # shard's order, taken under the shard lock. A peer's turn for the
+        # shard moves on once the previous update was acked (or, for batched
+        # mode, queued), while other peers and shards are already being
+        # served. Deltas need no turns, see Unordered.
+        metrics = self.metrics
+        if metrics is not None and outgoing:
+            fanout = metrics.timer("propagate.fanout")
+        calls = []
+        shard, number = ticket
+        # Peers before `served` have had their turn for this ticket moved
+        # on, or will once their call completes.
+        served = 0
+        try:
+            for i in range(len(outgoing)):
+                turn = self.peerTurns[i][shard]
+                turn.wait(number)
+                if metrics is not None and self.propagation != "batched":
+                    # Batched sends are timed per batch by the peer queue.
+                    acked = metrics.timer(f"propagate.peer.{self.stubListBranchMapping[i]}")
+                if self.propagation == "batched":
+                    calls.append(self.peerQueues[i].put(outgoing[i]))
+                    served = i + 1
+                    turn.advance()
+                elif self.propagation == "parallel":
+                    call = self.stubList[i].MsgDelivery.future(outgoing[i])
+                    served = i + 1
+                    call.add_done_callback(turn.advance)
+                    if metrics is not None:
+                        call.add_done_callback(acked)
+                    calls.append(call)
+                else:
+                    served = i + 1
+                    try:
+                        self.stubList[i].MsgDelivery(outgoing[i])
+                    finally:
+                        turn.advance()
+                    if metrics is not None:
+                        acked()
+        except BaseException:
+            self.skipTurns(ticket, served, len(outgoing))
+            raise
+        if calls:
+            self.waitForAcks(calls)
+        if metrics is not None and outgoing:
+            fanout()
+
+    def skipTurns(self, ticket, start, end):
+        # Gives up `ticket`'s turn at peers start..end-1 without sending, so
+        # a failed propagation does not hold back later updates of its
+        # shard forever.
+        shard, number = ticket
+        for i in range(start, end):
+            turn = self.peerTurns[i][shard]
+            turn.wait(number)
+            turn.advance()
+
+    def waitForAcks(self, calls):
+        needed = len(calls)
+        if self.quorum is not None:
+            needed = max(0, min(self.quorum, len(calls)))
+        done = threading.Condition()
+        acked = []
+        failed = []
+
+        def on_done(call):
+            with done:
+                if call.exception() is None:
+                    acked.append(call)
+                else:
+                    failed.append(call.exception())
+                done.notify()
+
+        for call in calls:
+            call.add_done_callback(on_done)
+        with done:
+            done.wait_for(lambda: len(acked) >= needed or len(calls) - len(failed) < needed)
+        if len(acked) < needed:
+            raise failed[0]
 
     def Query(self, request):
-        return {
-            "id": self.id,
-            "event_id": request.event_id,
-            "balance": self.balance,
-            "clock": self.clock
-        }
+        if request.stale:
+            # Behind by at most the update being applied right now. Updates
+            # tick the clock before changing a balance, so reading the
+            # balance first never pairs it with a clock from before it. The
+            # reply is still stamped after the request.
+            balance = self.accounts.get(request.account)
+            return bank_pb2.MsgDeliveryResponse(id=self.id, event_id=request.event_id, balance=balance,
+                                                clock=max(self.clock, request.clock) + 1)
+        with self.accounts.shard(request.account).lock:
+            with self.lock:
+                self.receive(request)
+                balance, clock = self.accounts.get(request.account), self.clock
+        if self.wal is not None:
+            # Only report a balance that survives a crash.
+            self.wal.commit()
+        return bank_pb2.MsgDeliveryResponse(id=self.id, event_id=request.event_id, balance=balance, clock=clock)
 
     def Withdraw(self, request):
-        self.branch_logs["events"].append({
-            "customer-request-id": request.event_id,
-            "logical_clock": self.clock,
-            "interface": "deposit",
-            "comment": f"event_recv from customer {request.id}"
-        })
-        status = "fail"
-        if self.balance >= request.money:
-            status = "success"
-            self.balance -= request.money
-            if len(self.channelList) == 0:
-                for id in self.branches:
-                    if id == self.id:
-                        continue
-                    port = 50051 + id
-                    channel = grpc.insecure_channel(
-                        f"localhost:{port}")
-                    self.channelList.append(channel)
-                    stub = bank_pb2_grpc.BankStub(channel)
-                    self.stubList.append(stub)
-                    self.stubListBranchMapping.append(id)
-            for i in range(len(self.stubList)):
-                stub = self.stubList[i]
-                recv_branch = self.stubListBranchMapping[i]
-                self.clock += 1
-                self.branch_logs["events"].append({
-                    "customer-request-id": request.event_id,
-                    "logical_clock": self.clock,
-                    "interface": "propogate_withdraw",
-                    "comment": f"event_sent to branch {recv_branch}"
-                })
-                stub.MsgDelivery(
-                    bank_pb2.MsgDeliveryRequest(id=self.id, event_id=request.event_id, balance=self.balance, interface="propagatewithdraw", clock=self.clock))
-        return {
-            "id": self.id,
-            "event_id": request.event_id,
-            "result": status
-        }
+        self.connectPeers()
+        ticket, outgoing = None, None
+        account = request.account
+        shard = self.accounts.shard(account)
+        with shard.lock:
+            balance = self.accounts.get(account)
+            with self.lock:
+                self.receive(request)
+                self.logEvent(request.event_id, "deposit", RECV_FROM_CUSTOMER, request.id)
+                status = "fail"
+                if balance >= request.money:
+                    status = "success"
+                    balance -= request.money
+                    self.accounts.set(account, balance)
+                    outgoing = self.preparePropagation(request, bank_pb2.PROPAGATE_WITHDRAW, -request.money,
+                                                       balance)
+                    self.logUpdate(ADD, self.id, account, -request.money, self.seq)
+                else:
+                    self.logUpdate(ADD, self.id, account, 0, 0)
+                clock = self.clock
+            if outgoing is not None:
+                ticket = shard.takeTicket()
+        return bank_pb2.MsgDeliveryResponse(id=self.id, event_id=request.event_id, result=status,
+                                            clock=clock), ticket, outgoing
 
     def Propagate_Deposit(self, request):
-        self.branch_logs["events"].append({
-            "customer-request-id": request.event_id,
-            "logical_clock": self.clock,
-            "interface": "propogate_deposit",
-            "comment": f"event_recv from bank {request.id}"
-        })
-        self.balance = request.balance
-        return {
-            "result": "success"
-        }
+        clock = self.applyUpdate(request, "propogate_deposit")
+        return bank_pb2.MsgDeliveryResponse(result="success", clock=clock), None, None
 
     def Propagate_Withdraw(self, request):
-        self.branch_logs["events"].append({
-            "customer-request-id": request.event_id,
-            "logical_clock": self.clock,
-            "interface": "propogate_withdraw",
-            "comment": f"event_recv from bank {request.id}"
-        })
-        self.balance = request.balance
-        return {
-            "result": "success"
-        }
+        clock = self.applyUpdate(request, "propogate_withdraw")
+        return bank_pb2.MsgDeliveryResponse(result="success", clock=clock), None, None
+
+    def applyUpdate(self, request, log_interface):
+        # Returns the clock after it. A delta is applied once however often
+        # and in whatever order it arrives; an absolute balance just
+        # replaces the account's.
+        account = request.account
+        with self.accounts.shard(account).lock:
+            with self.lock:
+                self.receive(request)
+                self.logEvent(request.event_id, log_interface, RECV_FROM_BANK, request.id)
+                if not request.seq:
+                    self.accounts.set(account, request.balance)
+                    self.logUpdate(SET, request.id, account, request.balance, 0)
+                else:
+                    if self.markApplied(request.id, request.seq):
+                        self.accounts.add(account, request.money)
+                    self.logUpdate(ADD, request.id, account, request.money, request.seq)
+                return self.clock
+
+    def markApplied(self, origin, seq):
+        # Returns False if origin's update `seq` was already applied.
+        version = self.versions.get(origin, 0)
+        ahead = self.ahead.get(origin)
+        if seq <= version or (ahead and seq in ahead):
+            return False
+        if seq != version + 1:
+            self.ahead.setdefault(origin, set()).add(seq)
+            return True
+        version = seq
+        while ahead and version + 1 in ahead:
+            version += 1
+            ahead.remove(version)
+        self.versions[origin] = version
+        return True
+
+    def read(self, request, reader):
+        handler, name = reader
+        metrics = self.metrics
+        if metrics is None:
+            return handler(request)
+        start = metrics.begin()
+        try:
+            return handler(request)
+        finally:
+            metrics.end(name, start)
 
     def MsgDelivery(self, request, context):
-        self.recvMsg.append(request)
-        self.clock = max(self.clock, request.clock) + 1
-        if request.interface == "query":
-            response = self.Query(request=request)
-        elif request.interface == "deposit":
-            response = self.Deposit(request=request)
-        elif request.interface == "withdraw":
-            response = self.Withdraw(request=request)
-        elif request.interface == "propagatewithdraw":
-            response = self.Propagate_Withdraw(request=request)
-        elif request.interface == "propagatedeposit":
-            response = self.Propagate_Deposit(request=request)
-        id = response.get("id", None)
-        event_id = response.get("event_id", None)
-        balance = response.get("balance", None)
-        result = response.get("result", None)
-        filename = f"branch-{self.id}.json"
-        output_path = os.path.join("output", filename)
-        with open(output_path, 'w') as file:
-            json.dump(self.branch_logs, file, indent=4)
-        return bank_pb2.MsgDeliveryResponse(id=id, event_id=event_id, balance=balance, result=result, clock=self.clock)
-
-
-def start_grpc_servers(branches):
+        if self.limiter is not None and request.interface in ADMITTED:
+            return self.admit(request, context)
+        return self.deliver(request, context)
+
+    def admit(self, request, context):
+        # Latency counts from when the call was queued for a worker, see
+        # create_grpc_servers.
+        limiter = self.limiter
+        now = time.perf_counter()
+        start = queued_at() or now
+        if not limiter.acquire(now - start):
+            if self.metrics is not None:
+                self.metrics.count("admission.rejected")
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f"branch {self.id} is overloaded, retry later")
+        try:
+            return self.deliver(request, context)
+        finally:
+            limiter.release(None if request.interface == bank_pb2.QUERY else time.perf_counter() - start)
+
+    def deliver(self, request, context):
+        reader = self.readHandlers.get(request.interface)
+        if reader is not None:
+            return self.read(request, reader)
+        entry = self.handlers.get(request.interface)
+        if entry is None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"unknown interface {request.interface}")
+        handler, name = entry
+        metrics = self.metrics
+        if metrics is not None:
+            start = metrics.begin()
+        try:
+            self.recvMsg.append(request)
+            response, ticket, outgoing = handler(request)
+            try:
+                self.commitUpdates()
+            except BaseException:
+                if ticket is not None:
+                    self.skipTurns(ticket, 0, len(outgoing))
+                raise
+            if ticket is not None:
+                self.propagate(ticket, outgoing)
+            self.eventLog.checkpoint()
+        finally:
+            if metrics is not None:
+                metrics.end(name, start)
+        return response
+
+    def MsgDeliveryStream(self, request_iterator, context):
+        # Not admission controlled: a rejection would end the whole stream.
+        for request in request_iterator:
+            yield self.deliver(request, context)
+
+    def batchError(self, request):
+        # Batches only carry propagations. Checked before anything in the
+        # batch is applied.
+        for msg in request.requests:
+            if msg.interface not in LOG_INTERFACES:
+                return f"batch entry with interface {msg.interface}, expected a propagation"
+        return None
+
+    def MsgDeliveryBatch(self, request, context):
+        error = self.batchError(request)
+        if error is not None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, error)
+        metrics = self.metrics
+        if metrics is not None:
+            start = metrics.begin()
+        try:
+            clock = self.clock
+            for msg in request.requests:
+                self.recvMsg.append(msg)
+                clock = self.applyUpdate(msg, LOG_INTERFACES[msg.interface])
+            self.commitUpdates()
+            self.eventLog.checkpoint()
+        finally:
+            if metrics is not None:
+                metrics.count("batch.requests", len(request.requests))
+                metrics.end("handle.batch", start)
+        return bank_pb2.MsgDeliveryResponse(id=self.id, result="success", clock=clock)
+
+
+def create_grpc_servers(branches, max_workers=10, peers=None, warmup_timeout=30, branch_class=None, **options):
+    # `peers` lists every branch id in the system when only some of them are
+    # hosted here. Returns once every branch is connected to its peers, or
+    # after `warmup_timeout` seconds with warming left to the background.
+    # `branch_class` swaps in a Branch subclass, e.g. for instrumentation.
     servers = []
-    branchPrcoessId = []
-    for i in range(len(branches)):
-        branchPrcoessId.append(branches[i]["id"])
+    servicers = []
+    branchPrcoessId = peers or [branch["id"] for branch in branches]
+    base_port = options.get("base_port", BASE_PORT)
+    branch_class = branch_class or Branch
+    # Admission control needs to know how long calls wait for a worker.
+    executor = QueueTimingExecutor if options.get("admission_limit") else futures.ThreadPoolExecutor
 
     for i in range(len(branches)):
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-        branch = Branch(id=branches[i]["id"],
-                        balance=branches[i]["balance"], branches=branchPrcoessId)
+        server = grpc.server(executor(max_workers=max_workers), options=SERVER_OPTIONS)
+        branch = branch_class(id=branches[i]["id"],
+                              balance=branches[i]["balance"], branches=branchPrcoessId, **options)
         bank_pb2_grpc.add_BankServicer_to_server(branch, server)
-        port = 50051 + branches[i]["id"]
+        port = base_port + branches[i]["id"]
         server.add_insecure_port(f'[::]:{port}')
         server.start()
         print(f"Branch {branches[i]['id']} started on port: {port}")
+        if branch.recovered:
+            print(f"Branch {branch.id} recovered balance {branch.balance} at clock {branch.clock}")
         servers.append(server)
+        servicers.append(branch)
+    warm_branches(servicers, warmup_timeout)
+    return servers, servicers
+
+
+def warm_branches(servicers, timeout):
+    for branch in servicers:
+        unready = branch.warmPeers(timeout)
+        if unready:
+            print(f"Branch {branch.id} could not reach {', '.join(unready)} yet, still trying")
+            threading.Thread(target=branch.warmPeers, daemon=True).start()
 
-    for server in servers:
-        server.wait_for_termination()
 
+def stop_grpc_servers(servers, servicers, grace=1):
+    for event in [server.stop(grace) for server in servers]:
+        event.wait()
+    for branch in servicers:
+        branch.close()
+    channel_pool.pool.close()
+
+
+def wait_for_shutdown_signal():
+    stop = threading.Event()
+
+    def on_signal(signum, frame):
+        stop.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    stop.wait()
+
+
+def start_grpc_servers(branches, **options):
+    servers, servicers = create_grpc_servers(branches, **options)
     try:
-        while True:
-            pass
-    except KeyboardInterrupt:
+        wait_for_shutdown_signal()
         print("\nStopping all servers.")
-        for server in servers:
-            server.stop(0)
+    finally:
+        stop_grpc_servers(servers, servicers)
 
 
-if __name__ == '__main__':
-    file_path = f'{sys.argv[1]}'
-    with open(file_path, 'r') as json_file:
-        data = json.load(json_file)
+def serve_branch_group(group, peers, aio, options, ready, stop):
+    # Runs in a child process. The parent owns signal handling and tells the
+    # group to stop through `stop`.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    ids = [branch["id"] for branch in group]
+    try:
+        if aio:
+            from aio_branch import create_aio_servers, stop_aio_servers
 
-    branches = []
+            async def run():
+                servers, servicers = await create_aio_servers(group, peers=peers, **options)
+                ready.put(("ready", ids, os.getpid()))
+                await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+                await stop_aio_servers(servers, servicers)
+            asyncio.run(run())
+        else:
+            servers, servicers = create_grpc_servers(group, peers=peers, **options)
+            ready.put(("ready", ids, os.getpid()))
+            stop.wait()
+            stop_grpc_servers(servers, servicers)
+    except Exception as error:
+        ready.put(("error", ids, f"{type(error).__name__}: {error}"))
+
+
+def start_multiprocess_servers(branches, processes, aio=False, ready_timeout=30, **options):
+    # Splits the branches into `processes` contiguous groups, each served
+    # from its own interpreter.
+    processes = max(1, min(processes, len(branches)))
+    size = -(-len(branches) // processes)
+    groups = [branches[i:i + size] for i in range(0, len(branches), size)]
+    peers = [branch["id"] for branch in branches]
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    stop = context.Event()
+    children = [context.Process(target=serve_branch_group, args=(group, peers, aio, options, ready, stop))
+                for group in groups]
+    for child in children:
+        child.start()
+
+    failed = False
+    try:
+        for _ in children:
+            try:
+                status, ids, detail = ready.get(timeout=ready_timeout)
+            except queue.Empty:
+                print(f"Branch processes not ready after {ready_timeout}s")
+                failed = True
+                break
+            if status == "error":
+                print(f"Branches {ids} failed to start: {detail}")
+                failed = True
+                break
+            print(f"Branches {ids} ready in process {detail}")
+        if not failed:
+            print(f"All {len(branches)} branches ready in {len(children)} processes")
+            wait_for_shutdown_signal()
+            print("\nStopping all servers.")
+    finally:
+        stop.set()
+        for child in children:
+            child.join(10)
+            if child.is_alive():
+                child.terminate()
+    return not failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input")
+    parser.add_argument("--propagation", choices=["sequential", "parallel", "batched"], default="sequential",
+                        help="send propagation to peers one by one, all at once, or through per-peer batching queues")
+    parser.add_argument("--quorum", type=int, default=None,
+                        help="with parallel or batched propagation, reply after this many peer acks (default: all)")
+    parser.add_argument("--batch-window-ms", type=float, default=1.0,
+                        help="how long a batched propagation waits for more updates to the same peer")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="most propagations coalesced into one MsgDeliveryBatch")
+    parser.add_argument("--log-flush-every", type=int, default=1,
+                        help="write the branch event log every N requests (0: only on timer or shutdown)")
+    parser.add_argument("--log-flush-interval", type=float, default=None,
+                        help="also write the branch event log every this many seconds")
+    parser.add_argument("--replication", choices=["absolute", "delta"], default="absolute",
+                        help="propagate new balances in order, or signed deltas that peers apply in any order")
+    parser.add_argument("--data-dir", default=None,
+                        help="keep a write-ahead log and snapshots of each branch here, and recover from them on start")
+    parser.add_argument("--snapshot-every", type=int, default=10000,
+                        help="snapshot a branch and empty its log after this many logged updates (0: never)")
+    parser.add_argument("--wal-fsync", action=argparse.BooleanOptionalAction, default=True,
+                        help="fsync the log before acknowledging updates")
+    parser.add_argument("--shards", type=int, default=16,
+                        help="account shards per branch, each with its own lock and propagation order")
+    parser.add_argument("--admission-limit", type=int, default=None,
+                        help="serve at most this many customer requests at once, fewer while latency is up, "
+                             "and turn the rest away with RESOURCE_EXHAUSTED")
+    parser.add_argument("--metrics", action="store_true",
+                        help="collect counters and latency histograms, served by the GetStats RPC")
+    parser.add_argument("--recv-history", type=int, default=0,
+                        help="keep the last N received requests in memory for debugging")
+    parser.add_argument("--max-workers", type=int, default=10,
+                        help="gRPC worker threads per branch server")
+    parser.add_argument("--aio", action="store_true",
+                        help="serve branches from one asyncio event loop (grpc.aio), propagating to peers concurrently")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="spread the branches over this many processes")
+    parser.add_argument("--group-size", type=int, default=None,
+                        help="branches per process, instead of --processes")
+    parser.add_argument("--base-port", type=int, default=BASE_PORT,
+                        help="branch N listens on base port + N")
+    parser.add_argument("--warmup-timeout", type=float, default=30,
+                        help="seconds to wait for peer connections before reporting ready")
+    args = parser.parse_args()
+    if args.aio and args.propagation == "batched":
+        parser.error("--aio does not support batched propagation")
+    # Records are decoded one at a time; customer records are dropped as soon
+    # as they are read.
+    branches = [record for record in iter_records(args.input) if record["type"] == "branch"]
 
-    for i in range(len(data)):
-        if (data[i]["type"] == "branch"):
-            branches.append(data[i])
+    options = dict(quorum=args.quorum, log_flush_every=args.log_flush_every,
+                   log_flush_interval=args.log_flush_interval, base_port=args.base_port,
+                   warmup_timeout=args.warmup_timeout, recv_history=args.recv_history,
+                   metrics=args.metrics, replication=args.replication, data_dir=args.data_dir,
+                   snapshot_every=args.snapshot_every, wal_fsync=args.wal_fsync, shards=args.shards,
+                   admission_limit=args.admission_limit)
+    if not args.aio:
+        options.update(max_workers=args.max_workers, propagation=args.propagation,
+                       batch_window=args.batch_window_ms / 1000, batch_size=args.batch_size)
+    processes = args.processes
+    if args.group_size:
+        processes = -(-len(branches) // args.group_size)
 
-    start_grpc_servers(branches)
+    if processes > 1:
+        if not start_multiprocess_servers(branches, processes, aio=args.aio, **options):
+            sys.exit(1)
+    elif args.aio:
+        from aio_branch import start_aio_servers
+        asyncio.run(start_aio_servers(branches, **options))
+    else:
+        start_grpc_servers(branches, **options)
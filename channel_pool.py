@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import grpc
+import bank_pb2_grpc
+
+BASE_PORT = 50051
+
+KEEPALIVE_MS = 30000
+MAX_CONCURRENT_STREAMS = 1000
+
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", KEEPALIVE_MS),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+SERVER_OPTIONS = [
+    # Refuse to share a port with a stale server instead of splitting traffic.
+    ("grpc.so_reuseport", 0),
+    ("grpc.max_concurrent_streams", MAX_CONCURRENT_STREAMS),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_recv_ping_interval_without_data_ms", KEEPALIVE_MS // 2),
+    ("grpc.http2.max_ping_strikes", 0),
+]
+
+
+def branch_target(id, base_port=BASE_PORT):
+    return f"localhost:{base_port + id}"
+
+
+class ChannelPool:
+    # One channel (and Bank stub) per target, shared by every Branch and
+    # Customer in the process. aio channels are bound to the event loop that
+    # uses them, so those live in their own pool.
+    def __init__(self, aio=False, options=CHANNEL_OPTIONS):
+        self.aio = aio
+        self.options = options
+        self.lock = threading.Lock()
+        self.channels = {}
+        self.stubs = {}
+
+    def channel(self, target):
+        channel = self.channels.get(target)
+        if channel is not None:
+            return channel
+        with self.lock:
+            if target not in self.channels:
+                if self.aio:
+                    channel = grpc.aio.insecure_channel(target, options=self.options)
+                else:
+                    channel = grpc.insecure_channel(target, options=self.options)
+                self.stubs[target] = bank_pb2_grpc.BankStub(channel)
+                self.channels[target] = channel
+            return self.channels[target]
+
+    def stub(self, target):
+        stub = self.stubs.get(target)
+        if stub is None:
+            self.channel(target)
+            stub = self.stubs[target]
+        return stub
+
+    def warm(self, targets, timeout=None):
+        # Connects every target at once and returns the ones that did not
+        # become ready within `timeout` seconds.
+        futures = [(target, grpc.channel_ready_future(self.channel(target))) for target in targets]
+        unready = []
+        for target, future in futures:
+            try:
+                future.result(timeout=timeout)
+            except grpc.FutureTimeoutError:
+                future.cancel()
+                unready.append(target)
+        return unready
+
+    async def warmAsync(self, targets, timeout=None):
+        async def ready(target):
+            try:
+                await asyncio.wait_for(self.channel(target).channel_ready(), timeout)
+                return None
+            except asyncio.TimeoutError:
+                return target
+        results = await asyncio.gather(*(ready(target) for target in targets))
+        return [target for target in results if target is not None]
+
+    def drain(self):
+        with self.lock:
+            channels = list(self.channels.values())
+            self.channels.clear()
+            self.stubs.clear()
+        return channels
+
+    def close(self):
+        for channel in self.drain():
+            channel.close()
+
+    async def closeAsync(self):
+        for channel in self.drain():
+            await channel.close()
+
+
+pool = ChannelPool()
@@ -0,0 +1,152 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grpc
+import bank_pb2
+import bank_pb2_grpc
+from branch import create_grpc_servers
+from channel_pool import BASE_PORT, branch_target
+
+parser = argparse.ArgumentParser(description="Hammer one branch with concurrent customers and check the replicas agree.")
+parser.add_argument("--branches", type=int, default=5)
+parser.add_argument("--clients", type=int, default=40)
+parser.add_argument("--requests", type=int, default=25, help="requests per client")
+parser.add_argument("--target", type=int, default=1, help="branch every client talks to")
+parser.add_argument("--spread", action="store_true", help="client c talks to branch c %% branches + 1 instead")
+parser.add_argument("--balance", type=int, default=1000)
+parser.add_argument("--accounts", type=int, default=1, help="accounts the requests are spread over")
+parser.add_argument("--shards", type=int, default=16)
+parser.add_argument("--max-workers", type=int, default=10)
+parser.add_argument("--propagation", choices=["sequential", "parallel", "batched"], default="sequential")
+parser.add_argument("--replication", choices=["absolute", "delta"], default="absolute")
+parser.add_argument("--admission-limit", type=int, default=None,
+                    help="let the branches turn requests away; those must leave no trace")
+parser.add_argument("--base-port", type=int, default=BASE_PORT, help="branch N listens on base port + N")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--switch-interval", type=float, default=0.00001,
+                    help="interpreter thread switch interval, smaller interleaves handlers harder")
+args = parser.parse_args()
+sys.setswitchinterval(args.switch_interval)
+
+failures = []
+
+
+def fail(message):
+    if len(failures) < 20:
+        print(f"  FAIL: {message}")
+    failures.append(message)
+
+
+def run_client(client, outcomes):
+    rng = random.Random(args.seed * 100003 + client)
+    target = client % args.branches + 1 if args.spread else args.target
+    channel = grpc.insecure_channel(branch_target(target, args.base_port))
+    stub = bank_pb2_grpc.BankStub(channel)
+    for r in range(args.requests):
+        interface = rng.choice([bank_pb2.DEPOSIT, bank_pb2.WITHDRAW])
+        money = rng.randint(1, 20)
+        account = rng.randrange(args.accounts) if args.accounts > 1 else 0
+        event_id = client * args.requests + r
+        try:
+            response = stub.MsgDelivery(bank_pb2.MsgDeliveryRequest(
+                id=client, event_id=event_id, interface=interface, money=money, account=account, clock=r + 1))
+        except grpc.RpcError as error:
+            if error.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+                raise
+            outcomes.append((event_id, account, interface, money, "rejected"))
+            continue
+        outcomes.append((event_id, account, interface, money, response.result))
+    channel.close()
+
+
+cwd = os.getcwd()
+with tempfile.TemporaryDirectory() as scratch:
+    os.makedirs(os.path.join(scratch, "output"))
+    os.chdir(scratch)
+    branches = [{"id": i, "type": "branch", "balance": args.balance} for i in range(1, args.branches + 1)]
+    servers, servicers = create_grpc_servers(branches, max_workers=args.max_workers, propagation=args.propagation,
+                                            replication=args.replication, shards=args.shards,
+                                            admission_limit=args.admission_limit, base_port=args.base_port)
+    outcomes = []
+    threads = [threading.Thread(target=run_client, args=(c, outcomes)) for c in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    for server in servers:
+        server.stop(None)
+    for branch in servicers:
+        branch.close()
+    os.chdir(cwd)
+
+total = args.clients * args.requests
+print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s), "
+      f"max_workers={args.max_workers}, propagation={args.propagation}, replication={args.replication}, "
+      f"accounts={args.accounts}")
+rejected = sum(1 for outcome in outcomes if outcome[4] == "rejected")
+if rejected:
+    print(f"{rejected} requests turned away")
+
+if len(outcomes) != total:
+    fail(f"{total - len(outcomes)} requests did not complete")
+
+# Final balances: every replica must hold exactly what the acknowledged
+# operations add up to.
+expected = [args.balance] * args.accounts
+for _, account, interface, money, result in outcomes:
+    if result == "rejected":
+        continue
+    if interface == bank_pb2.DEPOSIT:
+        expected[account] += money
+    elif result == "success":
+        expected[account] -= money
+for branch in servicers:
+    for account in range(args.accounts):
+        if branch.accounts.get(account) != expected[account]:
+            fail(f"branch {branch.id} account {account} balance {branch.accounts.get(account)}, "
+                 f"expected {expected[account]}")
+
+# Lamport clocks: strictly increasing within each branch log, and every
+# receive is later than the matching send.
+sent = {}
+received = {}
+for branch in servicers:
+    events = branch.branch_logs["events"]
+    for previous, event in zip(events, events[1:]):
+        if event["logical_clock"] <= previous["logical_clock"]:
+            fail(f"branch {branch.id} clock went from {previous['logical_clock']} to {event['logical_clock']}")
+    for event in events:
+        peer = int(event["comment"].rsplit(" ", 1)[1])
+        if event["comment"].startswith("event_sent to branch"):
+            sent[(branch.id, peer, event["customer-request-id"])] = event["logical_clock"]
+        elif event["comment"].startswith("event_recv from bank"):
+            received[(peer, branch.id, event["customer-request-id"])] = event["logical_clock"]
+for key, clock in sent.items():
+    if key not in received:
+        fail(f"propagation {key} was sent but never received")
+    elif received[key] <= clock:
+        fail(f"propagation {key} received at clock {received[key]}, sent at {clock}")
+if len(received) != len(sent):
+    fail(f"{len(received)} propagations received, {len(sent)} sent")
+
+targets = servicers if args.spread else [branch for branch in servicers if branch.id == args.target]
+customer_events = [event for branch in targets for event in branch.branch_logs["events"]
+                   if event["comment"].startswith("event_recv from customer")]
+if len(customer_events) != total - rejected:
+    fail(f"branches {[branch.id for branch in targets]} logged {len(customer_events)} customer requests, "
+         f"expected {total - rejected}")
+
+print("\nSummary:")
+print(f"Final balance: {sum(expected)} over {args.accounts} accounts on {len(servicers)} branches")
+print(f"Propagations checked: {len(sent)}")
+print(f"Failures: {len(failures)}")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from branch import create_grpc_servers
+from channel_pool import BASE_PORT, ChannelPool
+from customer import Customer
+
+parser = argparse.ArgumentParser(description="Check a windowed customer gets the same results as a stop-and-wait one.")
+parser.add_argument("--branches", type=int, default=3)
+parser.add_argument("--pairs", type=int, default=400, help="deposit/withdraw pairs the customer sends")
+parser.add_argument("--window", type=int, default=16)
+parser.add_argument("--balance", type=int, default=0)
+parser.add_argument("--money", type=int, default=10, help="amount of every deposit and withdraw")
+parser.add_argument("--max-workers", type=int, default=10)
+parser.add_argument("--propagation", choices=["sequential", "parallel", "batched"], default="sequential")
+parser.add_argument("--driver", choices=["threads", "asyncio"], default="threads")
+parser.add_argument("--base-port", type=int, default=BASE_PORT, help="branch N listens on base port + N")
+args = parser.parse_args()
+
+failures = []
+
+
+def fail(message):
+    if len(failures) < 20:
+        print(f"  FAIL: {message}")
+    failures.append(message)
+
+
+class RecordingCustomer(Customer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.results = []
+
+    def succeeded(self, response):
+        self.results.append((response.event_id, response.result))
+        return super().succeeded(response)
+
+
+def customer_events():
+    # From a zero balance every withdraw takes out exactly what the deposit
+    # before it put in, so one applied ahead of its deposit fails.
+    events = []
+    for pair in range(args.pairs):
+        events.append({"customer-request-id": 2 * pair + 1, "interface": "deposit", "money": args.money})
+        events.append({"customer-request-id": 2 * pair + 2, "interface": "withdraw", "money": args.money})
+    return events
+
+
+async def run_async(customer):
+    pool = ChannelPool(aio=True)
+    try:
+        await customer.executeEventsAsync(pool.stub(customer.target))
+    finally:
+        await pool.closeAsync()
+
+
+def run(window, base_port):
+    # Results and final branch balances of one customer on fresh branches.
+    with tempfile.TemporaryDirectory() as scratch:
+        os.makedirs(os.path.join(scratch, "output"))
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        branches = [{"id": i, "type": "branch", "balance": args.balance} for i in range(1, args.branches + 1)]
+        servers, servicers = create_grpc_servers(branches, max_workers=args.max_workers,
+                                                propagation=args.propagation, base_port=base_port)
+        customer = RecordingCustomer(1, customer_events(), base_port=base_port, window=window)
+        try:
+            if args.driver == "asyncio":
+                asyncio.run(run_async(customer))
+            else:
+                customer.executeEvents()
+        finally:
+            for server in servers:
+                server.stop(None)
+            for branch in servicers:
+                branch.close()
+            os.chdir(cwd)
+    return customer.results, [branch.balance for branch in servicers]
+
+
+# Separate ports, so the windowed customer cannot reuse a channel to the
+# first run's branches.
+expected, expected_balances = run(1, args.base_port)
+results, balances = run(args.window, args.base_port + args.branches)
+
+if len(results) != len(expected):
+    fail(f"{len(results)} replies with window {args.window}, {len(expected)} stop-and-wait")
+for (event_id, result), (_, want) in zip(results, expected):
+    if result != want:
+        fail(f"request {event_id}: {result!r} with window {args.window}, {want!r} stop-and-wait")
+if balances != expected_balances:
+    fail(f"final balances {balances} with window {args.window}, {expected_balances} stop-and-wait")
+
+withdraws = expected[1::2]
+print(f"{len(expected)} requests, {sum(1 for _, result in withdraws if result != 'success')} withdraws failed "
+      f"stop-and-wait, window={args.window}, driver={args.driver}, propagation={args.propagation}")
+print("\nSummary:")
+print(f"Final balances: {expected_balances}")
+print(f"Failures: {len(failures)}")
@@ -0,0 +1,155 @@
+import argparse
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from events import EventStore, render_customer_event, render_event
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# File layout, all little-endian:
+#   header: magic, layout, event count n, group count g (32 bytes)
+#   columns, 8-byte ones first so every column is naturally aligned:
+#     group_len q[g], request_id q[n], clock q[n],
+#     group_id i[g], peer i[n],
+#     group_type B[g], interface B[n], kind B[n]
+# Events are stored in output order and split into groups of consecutive
+# events with the same owner: one group per customer in output-1, per branch
+# in output-2, and per run of same-owner events in output-3.
+MAGIC = b"BANKCOL1"
+HEADER = struct.Struct("<8sB7xQQ")
+GROUPED, FLAT = 0, 1
+TYPES = ("customer", "branch")
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+
+GROUP_COLUMNS = {"group_len": "q", "group_id": "i", "group_type": "B"}
+EVENT_COLUMNS = {"request_id": ("requestIds", "q"), "clock": ("clocks", "q"), "peer": ("peers", "i"),
+                 "interface": ("interfaces", "B"), "kind": ("kinds", "B")}
+COLUMN_ORDER = ("group_len", "request_id", "clock", "group_id", "peer", "group_type", "interface", "kind")
+ITEM_SIZES = {"q": 8, "i": 4, "B": 1}
+
+
+def column_code(name):
+    if name in GROUP_COLUMNS:
+        return GROUP_COLUMNS[name]
+    return EVENT_COLUMNS[name][1]
+
+
+def write_columnar(path, groups, layout=GROUPED):
+    # `groups` is a list of (type, id, EventStore). Each column is written
+    # straight from the stores' arrays.
+    count = sum(len(store) for _, _, store in groups)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, layout, count, len(groups)))
+        for name in COLUMN_ORDER:
+            if name == "group_len":
+                file.write(struct.pack(f"<{len(groups)}q", *(len(store) for _, _, store in groups)))
+            elif name == "group_id":
+                file.write(struct.pack(f"<{len(groups)}i", *(id for _, id, _ in groups)))
+            elif name == "group_type":
+                file.write(bytes(TYPE_CODES[type] for type, _, _ in groups))
+            else:
+                for _, _, store in groups:
+                    column = getattr(store, EVENT_COLUMNS[name][0])
+                    if sys.byteorder != "little":
+                        column = array(column.typecode, column)
+                        column.byteswap()
+                    file.write(column)
+
+
+def group_runs(events):
+    # Splits flat output-3 style events into runs of the same owner.
+    groups = []
+    for event in events:
+        if not groups or groups[-1][:2] != (event["type"], event["id"]):
+            store = EventStore(render_customer_event if event["type"] == "customer" else render_event)
+            groups.append((event["type"], event["id"], store))
+        groups[-1][2].appendRendered(event)
+    return groups
+
+
+class ColumnarFile:
+    # Maps a columnar file read-only. Columns are numpy arrays when numpy is
+    # installed and typed memoryviews otherwise, both backed by the mapping
+    # without copying.
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.layout, self.count, self.groups = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a columnar event file")
+        self.columns = {}
+        offset = HEADER.size
+        for name in COLUMN_ORDER:
+            code = column_code(name)
+            length = self.groups if name in GROUP_COLUMNS else self.count
+            if numpy is not None:
+                self.columns[name] = numpy.frombuffer(self.map, dtype=numpy.dtype(code).newbyteorder("<"),
+                                                      count=length, offset=offset)
+            else:
+                self.columns[name] = memoryview(self.map)[offset:offset + length * ITEM_SIZES[code]].cast(code)
+            offset += length * ITEM_SIZES[code]
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def iterGroups(self):
+        # Yields (type, id, rows), rows being (request_id, clock, interface, kind, peer).
+        c = self.columns
+        start = 0
+        for g in range(self.groups):
+            end = start + int(c["group_len"][g])
+            rows = ((int(c["request_id"][i]), int(c["clock"][i]), int(c["interface"][i]),
+                     int(c["kind"][i]), int(c["peer"][i])) for i in range(start, end))
+            yield TYPES[c["group_type"][g]], int(c["group_id"][g]), rows
+            start = end
+
+    def close(self):
+        self.columns.clear()
+        self.map.close()
+
+
+def to_json(path, out):
+    # Rebuilds the JSON layout of the output the file was exported from.
+    columns = ColumnarFile(path)
+    out.write("[")
+    first = True
+    for type, id, rows in columns.iterGroups():
+        render = render_customer_event if type == "customer" else render_event
+        if columns.layout == GROUPED:
+            if not first:
+                out.write(", ")
+            out.write(json.dumps({"id": id, "type": type, "events": [render(*row) for row in rows]}))
+            first = False
+            continue
+        for row in rows:
+            event = render(*row)
+            if type == "customer":
+                event = {"id": id, "customer-request-id": event["customer-request-id"], "type": type,
+                         "logical_clock": event["logical_clock"], "interface": event["interface"],
+                         "comment": event["comment"]}
+            else:
+                event = {"id": id, "type": type, **event}
+            if not first:
+                out.write(", ")
+            out.write(json.dumps(event))
+            first = False
+    out.write("]")
+    columns.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert a columnar output file back to JSON.")
+    parser.add_argument("input")
+    parser.add_argument("-o", "--output", default=None, help="JSON file to write (default: stdout)")
+    args = parser.parse_args()
+    if args.output:
+        with open(args.output, "w") as json_file:
+            to_json(args.input, json_file)
+    else:
+        to_json(args.input, sys.stdout)
@@ -1,161 +1,481 @@
 import time
-import sys
+import argparse
+import asyncio
 import json
 import os
+import random
+import sys
+import threading
 
 import grpc
 import bank_pb2
-import bank_pb2_grpc
-import concurrent.futures
+import itertools
+from eventlog import read_events
+from loader import iter_records, scan_input
+from events import EventStore, SENT_FROM_CUSTOMER, render_customer_event
+from columnar import FLAT, write_columnar, group_runs
+import channel_pool
+from channel_pool import BASE_PORT, branch_target, pool
+from metrics import format_summary, merge_responses
+
+# Input interfaces a customer sends, by their wire value.
+REQUEST_INTERFACES = {"deposit": bank_pb2.DEPOSIT, "withdraw": bank_pb2.WITHDRAW}
+
+
+class Window:
+    # Keeps at most `size` requests of a MsgDeliveryStream unanswered. The
+    # branch serves a stream one request at a time, in order, so the window
+    # only overlaps round trips. A request is taken from eventRequests, which
+    # stamps it with the clock, once the reply it waits on is merged.
+    def __init__(self, customer, size):
+        self.customer = customer
+        self.size = size
+        self.outstanding = 0
+        self.closed = False
+        self.turn = threading.Condition()
+
+    def requests(self, requests):
+        # Runs on the thread gRPC sends the stream from.
+        while True:
+            with self.turn:
+                self.turn.wait_for(lambda: self.closed or self.outstanding < self.size)
+                request = None if self.closed else next(requests, None)
+                if request is None:
+                    return
+                self.outstanding += 1
+            yield request
+
+    def receive(self, response):
+        with self.turn:
+            self.customer.receive(self.customer.succeeded(response))
+            self.outstanding -= 1
+            self.turn.notify()
+
+    def close(self):
+        # Lets the sending thread go if the stream ended early.
+        with self.turn:
+            self.closed = True
+            self.turn.notify()
+
+
+class AsyncWindow:
+    # Window for a grpc.aio stream; everything runs on one loop.
+    def __init__(self, customer, size):
+        self.customer = customer
+        self.size = size
+        self.outstanding = 0
+        self.turn = asyncio.Condition()
+
+    async def requests(self, requests):
+        while True:
+            async with self.turn:
+                await self.turn.wait_for(lambda: self.outstanding < self.size)
+                request = next(requests, None)
+                if request is None:
+                    return
+                self.outstanding += 1
+            yield request
+
+    async def receive(self, response):
+        async with self.turn:
+            self.customer.receive(self.customer.succeeded(response))
+            self.outstanding -= 1
+            self.turn.notify()
 
 
 class Customer:
-    def __init__(self, id, events):
+    def __init__(self, id, events, stream=False, base_port=BASE_PORT, window=1, pool=None, queries=None,
+                 retries=8, retry_base=0.005, retry_cap=0.5, retry_tokens=10):
         self.id = id
-        self.events = events
+        # Events are consumed once, so they can come from a generator that
+        # reads the input lazily.
+        self.events = iter(events)
         self.recvMsg = list()
-        self.channel = None
+        # Where stubs come from: gRPC channels, or a local_transport.
+        self.pool = pool or channel_pool.pool
         self.stub = None
-        self.port = 50051 + id
+        self.target = branch_target(id, base_port)
         self.lastProcessedId = -1
         self.clock = 1
+        self.stream = stream
+        # Requests in flight at once in unary mode; 1 is stop-and-wait.
+        self.window = window
+        # Query events are skipped unless this is "strict" or "stale", see
+        # Branch.Query.
+        self.queries = queries
+        # A request a branch turns away as overloaded is sent again up to
+        # `retries` times, after a random pause of up to retry_base seconds,
+        # doubling per attempt up to retry_cap. The jitter keeps rejected
+        # customers from all coming back at the same moment. Retries are
+        # also throttled the way gRPC's retryThrottling does it: a rejection
+        # takes a token, a success gives back a tenth of one, and there are
+        # no retries while at most half of `retry_tokens` are left, so
+        # retries cannot pile onto a branch that keeps rejecting. Only
+        # stop-and-wait calls can be rejected: windowed and streamed requests
+        # go over MsgDeliveryStream, which is not admission controlled.
+        self.retries = retries
+        self.retryBase = retry_base
+        self.retryCap = retry_cap
+        self.maxRetryTokens = self.retryTokens = retry_tokens
+        self.retried = 0
+        self.random = random.Random()
+        # Ids of requests given up while still rejected. They were never
+        # applied; the result lists them under "rejected".
+        self.rejected = []
 
     def appendEvents(self, events):
-        self.events.extend(events)
+        self.events = itertools.chain(self.events, events)
 
     def createStub(self):
-        self.channel = grpc.insecure_channel(f"localhost:{self.port}")
-        stub = bank_pb2_grpc.BankStub(self.channel)
-        return stub
+        return self.pool.stub(self.target)
 
     def executeEvents(self):
         if self.stub is None:
             self.stub = self.createStub()
-        result = {
+        result = self.newResult()
+        requests = self.eventRequests(result)
+        if self.stream:
+            # Responses arrive in request order, one per deposit/withdraw.
+            for response in self.stub.MsgDeliveryStream(requests):
+                pass
+        elif self.window > 1:
+            # Concurrent unary calls would be served in any order, so the
+            # window runs over one stream, see Window.
+            window = Window(self, self.window)
+            try:
+                for response in self.stub.MsgDeliveryStream(window.requests(requests)):
+                    window.receive(response)
+            finally:
+                window.close()
+        else:
+            for request in requests:
+                response = self.call(request)
+                # self.clock = response.clock
+        return self.finish(result)
+
+    def backoff(self, error, attempt):
+        # Seconds to wait before retrying after `error`, or None to give up.
+        # Only a RESOURCE_EXHAUSTED rejection is retried: the branch applied
+        # nothing, so sending the request again cannot apply it twice.
+        if error.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+            return None
+        self.retryTokens = max(0, self.retryTokens - 1)
+        if attempt >= self.retries or self.retryTokens <= self.maxRetryTokens / 2:
+            return None
+        self.retried += 1
+        return self.random.uniform(0, min(self.retryCap, self.retryBase * 2 ** attempt))
+
+    def abandon(self, request, error):
+        # Called for a failed request that will not be retried. Any error
+        # other than a rejection is the run's problem.
+        if error.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+            raise error
+        self.rejected.append(request.event_id)
+        return None
+
+    def finish(self, result):
+        if self.rejected:
+            result["rejected"] = self.rejected
+        return result
+
+    def succeeded(self, response):
+        self.retryTokens = min(self.maxRetryTokens, self.retryTokens + 0.1)
+        return response
+
+    def call(self, request, attempt=0):
+        # The response, or None if the request was given up as rejected.
+        while True:
+            try:
+                return self.succeeded(self.stub.MsgDelivery(request))
+            except grpc.RpcError as error:
+                delay = self.backoff(error, attempt)
+                if delay is None:
+                    return self.abandon(request, error)
+            time.sleep(delay)
+            attempt += 1
+
+    async def executeEventsAsync(self, stub):
+        # Same as executeEvents, over a grpc.aio stub.
+        result = self.newResult()
+        requests = self.eventRequests(result)
+        if self.stream:
+            async for response in stub.MsgDeliveryStream(requests):
+                pass
+        elif self.window > 1:
+            window = AsyncWindow(self, self.window)
+            async for response in stub.MsgDeliveryStream(window.requests(requests)):
+                await window.receive(response)
+        else:
+            for request in requests:
+                response = await self.callAsync(stub, request)
+        return self.finish(result)
+
+    async def callAsync(self, stub, request):
+        # As call, over a grpc.aio stub.
+        attempt = 0
+        while True:
+            try:
+                return self.succeeded(await stub.MsgDelivery(request))
+            except grpc.RpcError as error:
+                delay = self.backoff(error, attempt)
+                if delay is None:
+                    return self.abandon(request, error)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def newResult(self):
+        return {
             "id": self.id,
             "type": "customer",
-            "events": []
+            "events": EventStore(render_customer_event)
         }
-        for i in range(self.lastProcessedId+1, len(self.events)):
-            self.lastProcessedId = i
-            # print(f"processing {self.events[i]['interface']} Event with Index: {i}")
-            if (self.events[i]["interface"] == "deposit"):
-                response = self.stub.MsgDelivery(bank_pb2.MsgDeliveryRequest(
-                    id=self.id, event_id=self.events[i]["customer-request-id"], interface="deposit", money=self.events[i]["money"], clock=self.clock))
-                result["events"].append({
-                    "customer-request-id": self.events[i]["customer-request-id"],
-                    "interface": self.events[i]["interface"],
-                    "logical_clock": self.clock,
-                    "comment": f"event_sent from customer {self.id}"
-                })
-                # self.clock = response.clock
-            if (self.events[i]["interface"] == "withdraw"):
-                response = self.stub.MsgDelivery(bank_pb2.MsgDeliveryRequest(
-                    id=self.id, event_id=self.events[i]["customer-request-id"], money=self.events[i]["money"], interface="withdraw", clock=self.clock))
-                result["events"].append({
-                    "customer-request-id": self.events[i]["customer-request-id"],
-                    "interface": self.events[i]["interface"],
-                    "logical_clock": self.clock,
-                    "comment": f"event_sent from customer {self.id}"
-                })
-                # self.clock = response.clock
+
+    def receive(self, response):
+        # Lamport receive rule for a reply: later sends are stamped after it.
+        # A request given up as rejected has no reply.
+        if response is None:
+            return
+        self.clock = max(self.clock, response.clock + 1)
+
+    def eventRequests(self, result):
+        for event in self.events:
+            self.lastProcessedId += 1
+            # print(f"processing {event['interface']} Event with Index: {self.lastProcessedId}")
+            interface = REQUEST_INTERFACES.get(event["interface"])
+            if interface is None and self.queries and event["interface"] == "query":
+                interface = bank_pb2.QUERY
+            if (interface is not None):
+                clock = self.clock
+                yield bank_pb2.MsgDeliveryRequest(
+                    id=self.id, event_id=event["customer-request-id"], interface=interface, money=event.get("money", 0),
+                    account=event.get("account", 0), stale=self.queries == "stale", clock=clock)
+                result["events"].append(event["customer-request-id"], clock, event["interface"],
+                                        SENT_FROM_CUSTOMER, self.id)
             self.clock += 1
-        return result
 
 
 def execute_customer(customer):
     return customer.executeEvents()
 
 
+def index_by_request(branch_events):
+    # Groups flattened branch events by customer-request-id in one pass. The
+    # sort is stable, so ties keep their output-2 order.
+    index = {}
+    for event in branch_events:
+        index.setdefault(event["customer-request-id"], []).append(event)
+    for events in index.values():
+        events.sort(key=lambda event: event["logical_clock"])
+    return index
+
+
+def merge_events(customer_data, index):
+    # output-3: each customer event followed by the branch events of the
+    # same request in clock order.
+    all_events = []
+    for customer in customer_data:
+        id = customer["id"]
+        for event in customer["events"]:
+            all_events.append({
+                "id": id,
+                "customer-request-id": event["customer-request-id"],
+                "type": "customer",
+                "logical_clock": event["logical_clock"],
+                "interface": event["interface"],
+                "comment": event["comment"]
+            })
+            all_events.extend(index.get(event["customer-request-id"], ()))
+    return all_events
+
+
+def wait_for_branches(targets, timeout, pool=pool):
+    # Readiness barrier: every branch must answer Health with ready=True,
+    # meaning it is serving and connected to all of its peers.
+    deadline = time.monotonic() + timeout
+    waiting = list(targets)
+    while waiting:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return waiting
+        still_waiting = []
+        for target in waiting:
+            try:
+                response = pool.stub(target).Health(bank_pb2.HealthRequest(), wait_for_ready=True,
+                                                    timeout=max(0.1, deadline - time.monotonic()))
+                if not response.ready:
+                    still_waiting.append(target)
+            except grpc.RpcError:
+                still_waiting.append(target)
+        waiting = still_waiting
+        if waiting:
+            time.sleep(0.05)
+    return []
+
+
+def collect_stats(targets, pool=pool):
+    # GetStats from every branch that collects metrics, merged.
+    responses = [pool.stub(target).GetStats(bank_pb2.StatsRequest()) for target in targets]
+    responses = [response for response in responses if response.enabled]
+    if not responses:
+        return None
+    return merge_responses(responses)
+
+
 if __name__ == '__main__':
-    file_path = f'{sys.argv[1]}'
-    with open(file_path, 'r') as json_file:
-        data = json.load(json_file)
-
-    customerData = []
-    customers = {}
-    response = []
-
-    for i in range(len(data)):
-        if (data[i]["type"] == "customer"):
-            if data[i]["id"] not in customers:
-                customers[data[i]["id"]] = Customer(
-                    data[i]["id"], data[i]["customer-requests"])
-            else:
-                customers[data[i]["id"]].appendEvents(
-                    data[i]["customer-requests"])
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(customers)) as executor:
-        customer_futures = [executor.submit(
-            execute_customer, customer) for customer in customers.values()]
-        concurrent.futures.wait(customer_futures)
-    customer_data = []
-    for future in customer_futures:
-        if future.done():
-            result = future.result()
-            customer_data.append(result)
-        else:
-            print("Task was not completed")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input")
+    parser.add_argument("--log-wait", type=float, default=0.0,
+                        help="seconds to wait before collecting branch logs, for branches that flush on a timer")
+    parser.add_argument("--stream", action="store_true",
+                        help="pipeline each customer's events over one MsgDeliveryStream call")
+    parser.add_argument("--window", type=int, default=1,
+                        help="keep up to this many requests of one MsgDeliveryStream unanswered per customer")
+    parser.add_argument("--base-port", type=int, default=BASE_PORT,
+                        help="branch N listens on base port + N")
+    parser.add_argument("--ready-timeout", type=float, default=30,
+                        help="seconds to wait for every branch to report ready")
+    parser.add_argument("--driver", choices=["threads", "asyncio"], default="threads",
+                        help="run customers on a thread pool or as coroutines on one event loop")
+    parser.add_argument("--workers", type=int, default=64,
+                        help="customers running at once, per process")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="shard the customers over this many processes")
+    parser.add_argument("--stats", action="store_true",
+                        help="print the branches' metrics at the end (branches need --metrics)")
+    parser.add_argument("--queries", choices=["strict", "stale"], default=None,
+                        help="send the input's query events as strict or stale reads (default: skip them)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="host the branches in this process and call them directly instead of over gRPC")
+    parser.add_argument("--retries", type=int, default=8,
+                        help="times to resend a request a branch turned away as overloaded")
+    parser.add_argument("--retry-base-ms", type=float, default=5.0,
+                        help="longest pause before the first retry; doubles per retry, jittered")
+    parser.add_argument("--retry-cap-ms", type=float, default=500.0, help="longest pause between retries")
+    parser.add_argument("--retry-tokens", type=float, default=10,
+                        help="retry budget: rejections spend one, successes earn a tenth back")
+    parser.add_argument("--columnar", action="store_true",
+                        help="also write output-N.col columnar files (see columnar.py)")
+    args = parser.parse_args()
+    # Imported here: driver imports this module for Customer.
+    from driver import ResultWriter, run_customers, run_sharded
+    if args.stream and args.window > 1:
+        parser.error("--window bounds the stream, --stream leaves it unbounded")
+    if args.in_process and (args.processes > 1 or args.driver != "threads"):
+        parser.error("--in-process runs the customers on threads in this process")
+    # One pass over the input keeps the branch records and where each
+    # customer's records are; a customer's requests are read back from disk
+    # as it runs.
+    data = scan_input(args.input)
+    customer_options = dict(stream=args.stream, base_port=args.base_port, window=args.window, queries=args.queries,
+                            retries=args.retries, retry_base=args.retry_base_ms / 1000,
+                            retry_cap=args.retry_cap_ms / 1000, retry_tokens=args.retry_tokens)
+
+    branch_targets = [branch_target(branch["id"], args.base_port) for branch in data.branches]
+    transport = pool
+    local_branches = []
+    if args.in_process:
+        from local_transport import LocalTransport, create_local_branches
+        transport = customer_options["pool"] = LocalTransport()
+        # Their logs are written once, when they are closed below.
+        local_branches = create_local_branches(data.branches, transport, args.base_port,
+                                               log_flush_every=0, metrics=args.stats)
+    else:
+        unready = wait_for_branches(branch_targets, args.ready_timeout)
+        if unready:
+            print(f"Branches not ready after {args.ready_timeout}s: {', '.join(unready)}")
+            sys.exit(1)
 
     # Generate 1st output file. CUSTOMER
-    output_path = os.path.join("output", "output-1.json")
-    with open(output_path, 'w') as json_file:
-        json.dump(customer_data, json_file)
+    # Each customer is written as soon as it finishes, in finishing order.
+    customer_path = os.path.join("output", "output-1.json")
+    writer = ResultWriter(customer_path)
+    customer_stores = []
 
-    # Generate 2nd output file. BRANCH
-    branch_data = []
-    for i in range(len(data)):
-        if (data[i]["type"] == "branch"):
-            output_path = os.path.join(
-                "output", f"branch-{data[i]['id']}.json")
-            with open(output_path, 'r') as branch_outputs:
-                branch_data.append(json.load(branch_outputs))
-            if os.path.exists(output_path):
-                os.remove(output_path)
+    rejected = 0
+
+    def finished(result):
+        global rejected
+        rejected += len(result.get("rejected", ()))
+        writer.write(result)
+        if args.columnar:
+            customer_stores.append(("customer", result["id"], result["events"]))
+
+    try:
+        if args.processes > 1:
+            run_sharded(args.input, list(data.customers.items()), args.processes, customer_options,
+                        args.driver, args.workers, finished)
+        else:
+            customers = (Customer(customer_id, data.customerRequests(customer_id), **customer_options)
+                         for customer_id in data.customers)
+            run_customers(args.driver, customers, args.workers, finished)
+    finally:
+        # Whatever finished is left as valid JSON.
+        writer.close()
+    if args.columnar:
+        write_columnar(os.path.join("output", "output-1.col"), customer_stores)
+        del customer_stores
 
+    # Generate 2nd output file. BRANCH
+    for branch in local_branches:
+        branch.close()
+    if args.log_wait:
+        time.sleep(args.log_wait)
+    # Branch logs are streamed line by line straight into output-2, keeping
+    # only the flattened copy needed for output-3.
+    flattened_data = []
+    branch_stores = []
     output_path = os.path.join("output", "output-2.json")
     with open(output_path, 'w') as json_file:
-        json.dump(branch_data, json_file)
+        json_file.write("[")
+        first_branch = True
+        for branch in data.branches:
+            branch_id = branch["id"]
+            if not first_branch:
+                json_file.write(", ")
+            first_branch = False
+            json_file.write(f'{{"id": {json.dumps(branch_id)}, "type": "branch", "events": [')
+            log_path = os.path.join("output", f"branch-{branch_id}.jsonl")
+            if args.columnar:
+                branch_stores.append(("branch", branch_id, EventStore()))
+            for n, event in enumerate(read_events(log_path)):
+                if n:
+                    json_file.write(", ")
+                json.dump(event, json_file)
+                if args.columnar:
+                    branch_stores[-1][2].appendRendered(event)
+                flattened_data.append({
+                    "id": branch_id,
+                    "type": "branch",
+                    "customer-request-id": event["customer-request-id"],
+                    "logical_clock": event["logical_clock"],
+                    "interface": event["interface"],
+                    "comment": event["comment"]
+                })
+            json_file.write("]}")
+            if os.path.exists(log_path):
+                os.remove(log_path)
+        json_file.write("]")
+    if args.columnar:
+        write_columnar(os.path.join("output", "output-2.col"), branch_stores)
+        del branch_stores
 
     # Generate 3rd output file. ALL EVENTS
-    flattened_data = []
-
-    for branch in branch_data:
-        branch_id = branch["id"]
-        branch_type = branch["type"]
-        for event in branch["events"]:
-            flattened_event = {
-                "id": branch_id,
-                "type": branch_type,
-                "customer-request-id": event["customer-request-id"],
-                "logical_clock": event["logical_clock"],
-                "interface": event["interface"],
-                "comment": event["comment"]
-            }
-            flattened_data.append(flattened_event)
-
-    all_events = []
-    for i in range(len(customer_data)):
-        id = customer_data[i]["id"]
-        for j in range(len(customer_data[i]["events"])):
-            all_events.append({
-                "id": id,
-                "customer-request-id": customer_data[i]["events"][j]["customer-request-id"],
-                "type": "customer",
-                "logical_clock":  customer_data[i]["events"][j]["logical_clock"],
-                "interface":  customer_data[i]["events"][j]["interface"],
-                "comment": customer_data[i]["events"][j]["comment"]
-            })
-            customer_request_id = customer_data[i]["events"][j]["customer-request-id"]
-            filtered_events = filter(
-                lambda event: event["customer-request-id"] == customer_request_id, flattened_data)
-            sorted_events = sorted(
-                filtered_events, key=lambda event: event["logical_clock"])
-            for event in sorted_events:
-                all_events.append(event)
+    # Customer events are read back from output-1 one customer at a time.
+    all_events = merge_events(iter_records(customer_path), index_by_request(flattened_data))
 
     output_path = os.path.join("output", "output-3.json")
     with open(output_path, 'w') as json_file:
         json.dump(all_events, json_file)
+    if args.columnar:
+        write_columnar(os.path.join("output", "output-3.col"), group_runs(all_events), FLAT)
 
     print("Task done, generated required files in output folder.")
+    if rejected:
+        print(f"{rejected} requests were still rejected after retrying, see \"rejected\" in output-1.")
+
+    if args.stats:
+        stats = collect_stats(branch_targets, transport)
+        if stats is None:
+            print("No branch collects metrics, start them with --metrics.")
+        else:
+            print(format_summary(*stats))
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import multiprocessing
+import queue
+from concurrent import futures
+
+from channel_pool import ChannelPool
+from customer import Customer
+from loader import iter_customer_requests
+
+
+class ResultWriter:
+    # Streams customer results into a JSON array (output-1) as they finish,
+    # so finished customers need not be kept around.
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.file.write("[")
+        self.count = 0
+
+    def write(self, result):
+        if self.count:
+            self.file.write(", ")
+        json.dump(result, self.file, default=list)
+        self.count += 1
+
+    def close(self):
+        self.file.write("]")
+        self.file.close()
+
+
+def run_threaded(customers, workers, on_result):
+    # At most `workers` customers run at once, each on a pool thread.
+    # `customers` is consumed lazily and `on_result` is called from this
+    # thread as customers finish.
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for customer in customers:
+            if len(pending) >= workers:
+                done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    on_result(future.result())
+            pending.add(executor.submit(customer.executeEvents))
+        for future in futures.as_completed(pending):
+            on_result(future.result())
+
+
+async def run_async(customers, workers, on_result):
+    # Same as run_threaded, with the customers as coroutines on one loop.
+    pool = ChannelPool(aio=True)
+    pending = set()
+    try:
+        for customer in customers:
+            if len(pending) >= workers:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    on_result(task.result())
+            pending.add(asyncio.ensure_future(customer.executeEventsAsync(pool.stub(customer.target))))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                on_result(task.result())
+    finally:
+        await pool.closeAsync()
+
+
+def run_customers(driver, customers, workers, on_result):
+    if driver == "asyncio":
+        asyncio.run(run_async(customers, workers, on_result))
+    else:
+        run_threaded(customers, workers, on_result)
+
+
+def run_shard(shard, path, spans, options, driver, workers, results):
+    # Runs in a child process; results go back to the parent one customer
+    # at a time, then (shard, None) marks the end.
+    try:
+        customers = (Customer(id, iter_customer_requests(path, customer_spans), **options)
+                     for id, customer_spans in spans)
+        run_customers(driver, customers, workers, lambda result: results.put((shard, result)))
+    except Exception as error:
+        results.put((shard, f"{type(error).__name__}: {error}"))
+        return
+    results.put((shard, None))
+
+
+def run_sharded(path, spans, processes, options, driver, workers, on_result):
+    # Deals the customers (id, spans) round-robin to `processes` children.
+    # The results queue is bounded so a slow writer holds the shards back
+    # instead of piling results up in memory.
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue(maxsize=4 * processes)
+    children = [context.Process(target=run_shard, args=(shard, path, spans[shard::processes], options,
+                                                        driver, workers, results))
+                for shard in range(processes)]
+    for child in children:
+        child.start()
+    running = set(range(processes))
+    try:
+        while running:
+            try:
+                shard, result = results.get(timeout=1)
+            except queue.Empty:
+                dead = [shard for shard in running if children[shard].exitcode is not None]
+                if dead:
+                    raise RuntimeError(f"customer shards {dead} exited early")
+                continue
+            if result is None:
+                running.discard(shard)
+            elif isinstance(result, str):
+                raise RuntimeError(f"customer shard {shard} failed: {result}")
+            else:
+                on_result(result)
+    finally:
+        for child in children:
+            child.join(10)
+            if child.is_alive():
+                child.terminate()
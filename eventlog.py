@@ -0,0 +1,79 @@
+import json
+import threading
+
+
+class EventLogWriter:
+    # Append-only, one JSON event per line. Events are buffered and written
+    # every `flush_every` requests (see checkpoint), every `flush_interval`
+    # seconds if set, and on close. With `render`, events are appended in a
+    # compact form and only turned into dicts when written. With `metrics`,
+    # flush times and the pending backlog are recorded.
+    def __init__(self, path, flush_every=1, flush_interval=None, render=None, metrics=None):
+        self.path = path
+        self.flush_every = flush_every
+        self.render = render
+        self.metrics = metrics
+        self.file = open(path, "w")
+        # `lock` only guards the pending list so appends never wait on disk,
+        # `fileLock` keeps flushed chunks in order.
+        self.lock = threading.Lock()
+        self.fileLock = threading.Lock()
+        self.pending = []
+        self.requests = 0
+        self.stopped = threading.Event()
+        self.flusher = None
+        if flush_interval:
+            self.flusher = threading.Thread(target=self.flushPeriodically, args=(flush_interval,), daemon=True)
+            self.flusher.start()
+        if metrics is not None:
+            metrics.gauge("log.pending", lambda: len(self.pending))
+
+    def append(self, event):
+        with self.lock:
+            self.pending.append(event)
+
+    def checkpoint(self):
+        # Called once per handled request.
+        with self.lock:
+            self.requests += 1
+            due = self.flush_every and self.requests >= self.flush_every
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.fileLock:
+            with self.lock:
+                self.requests = 0
+                events = self.pending
+                self.pending = []
+            if not events or self.file.closed:
+                return
+            if self.metrics is not None:
+                flushed = self.metrics.timer("log.flush")
+            for event in events:
+                if self.render is not None:
+                    event = self.render(*event)
+                self.file.write(json.dumps(event))
+                self.file.write("\n")
+            self.file.flush()
+            if self.metrics is not None:
+                flushed()
+
+    def flushPeriodically(self, interval):
+        while not self.stopped.wait(interval):
+            self.flush()
+
+    def close(self):
+        self.stopped.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        self.flush()
+        with self.fileLock:
+            self.file.close()
+
+
+def read_events(path):
+    with open(path, "r") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
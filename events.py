@@ -0,0 +1,77 @@
+from array import array
+
+INTERFACES = ("query", "deposit", "withdraw", "propogate_deposit", "propogate_withdraw")
+INTERFACE_CODES = {interface: code for code, interface in enumerate(INTERFACES)}
+
+# Comments are stored as a kind plus the peer id and only formatted when an
+# event is rendered.
+RECV_FROM_CUSTOMER, RECV_FROM_BANK, SENT_TO_BRANCH, SENT_FROM_CUSTOMER = range(4)
+COMMENTS = ("event_recv from customer {}", "event_recv from bank {}",
+            "event_sent to branch {}", "event_sent from customer {}")
+COMMENT_KINDS = {comment.rsplit(" ", 1)[0]: kind for kind, comment in enumerate(COMMENTS)}
+
+
+def render_event(event_id, clock, interface, kind, peer):
+    return {
+        "customer-request-id": event_id,
+        "logical_clock": clock,
+        "interface": INTERFACES[interface],
+        "comment": COMMENTS[kind].format(peer)
+    }
+
+
+def parse_comment(comment):
+    prefix, peer = comment.rsplit(" ", 1)
+    return COMMENT_KINDS[prefix], int(peer)
+
+
+def render_customer_event(event_id, clock, interface, kind, peer):
+    # Same fields, in the order output-1 has always used.
+    return {
+        "customer-request-id": event_id,
+        "interface": INTERFACES[interface],
+        "logical_clock": clock,
+        "comment": COMMENTS[kind].format(peer)
+    }
+
+
+class EventStore:
+    # Columnar event log: one typed array per field instead of a dict per
+    # event. Reads hand out rendered dicts, so it can stand in for the list
+    # of event dicts it replaces.
+    def __init__(self, render=render_event):
+        self.render = render
+        self.requestIds = array("q")
+        self.clocks = array("q")
+        self.interfaces = array("B")
+        self.kinds = array("B")
+        self.peers = array("i")
+
+    def append(self, event_id, clock, interface, kind, peer):
+        # Returns the compact form, for callers that keep their own copy.
+        row = (event_id, clock, INTERFACE_CODES[interface], kind, peer)
+        self.requestIds.append(event_id)
+        self.clocks.append(clock)
+        self.interfaces.append(row[2])
+        self.kinds.append(kind)
+        self.peers.append(peer)
+        return row
+
+    def appendRendered(self, event):
+        kind, peer = parse_comment(event["comment"])
+        return self.append(event["customer-request-id"], event["logical_clock"], event["interface"], kind, peer)
+
+    def row(self, i):
+        return (self.requestIds[i], self.clocks[i], self.interfaces[i], self.kinds[i], self.peers[i])
+
+    def __len__(self):
+        return len(self.clocks)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.render(*self.row(j)) for j in range(*i.indices(len(self)))]
+        return self.render(*self.row(i))
+
+    def __iter__(self):
+        for row in zip(self.requestIds, self.clocks, self.interfaces, self.kinds, self.peers):
+            yield self.render(*row)
@@ -0,0 +1,128 @@
+import json
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = " \t\r\n"
+
+
+class InputIndex:
+    # What a scan of the input keeps in memory: the branch records (a handful)
+    # and, per customer id, where that customer's records sit in the file.
+    def __init__(self, path):
+        self.path = path
+        self.branches = []
+        self.customers = {}
+
+    def customerRequests(self, id):
+        return iter_customer_requests(self.path, self.customers[id])
+
+
+def scan_input(path):
+    index = InputIndex(path)
+    for offset, length, record in iter_record_spans(path):
+        if record["type"] == "branch":
+            index.branches.append(record)
+        elif record["type"] == "customer":
+            index.customers.setdefault(record["id"], []).append((offset, length))
+    return index
+
+
+def iter_records(path):
+    for _, _, record in iter_record_spans(path):
+        yield record
+
+
+def iter_customer_requests(path, spans):
+    # Reads one customer record at a time, only when the previous one has
+    # been used up.
+    for offset, length in spans:
+        with open(path, "rb") as file:
+            file.seek(offset)
+            record = json.loads(file.read(length))
+        yield from record["customer-requests"]
+
+
+def iter_record_spans(path):
+    # Yields (byte offset, byte length, record) for every top-level record of
+    # either a JSON array (the input.json layout) or NDJSON, one record per
+    # line. Only one record is decoded at a time.
+    with open(path, "rb") as file:
+        first = file.read(CHUNK_SIZE)
+        file.seek(0)
+        if first.lstrip()[:1] == b"[":
+            yield from _iter_array_spans(file)
+        else:
+            yield from _iter_ndjson_spans(file)
+
+
+def _iter_ndjson_spans(file):
+    offset = 0
+    for line in file:
+        if line.strip():
+            yield offset, len(line), json.loads(line)
+        offset += len(line)
+
+
+def _iter_array_spans(file):
+    # The file is decoded as latin-1, which maps every byte to one character,
+    # so positions in the buffer are byte offsets in the file. Records with
+    # non-ASCII text are decoded again as UTF-8 before being handed out.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    base = 0
+    pos = 0
+    eof = False
+
+    def more(size=CHUNK_SIZE):
+        nonlocal buffer, base, pos, eof
+        if pos > CHUNK_SIZE:
+            buffer = buffer[pos:]
+            base += pos
+            pos = 0
+        data = file.read(size)
+        if not data:
+            eof = True
+        buffer += data.decode("latin-1")
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            more()
+
+    skip_whitespace()
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError("input is not a JSON array")
+    pos += 1
+    expect_comma = False
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("unexpected end of input")
+        if buffer[pos] == "]":
+            return
+        if expect_comma:
+            if buffer[pos] != ",":
+                raise ValueError(f"expected ',' at byte {base + pos}")
+            pos += 1
+            skip_whitespace()
+        if buffer[pos:pos + 1] != "{":
+            raise ValueError(f"expected a record at byte {base + pos}")
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                # The record runs past the buffer; read more and retry,
+                # growing the read so huge records do not go quadratic.
+                if eof:
+                    raise
+                more(max(CHUNK_SIZE, len(buffer) - pos))
+        text = buffer[pos:end]
+        if not text.isascii():
+            record = json.loads(text.encode("latin-1").decode("utf-8"))
+        yield base + pos, end - pos, record
+        pos = end
+        expect_comma = True
@@ -0,0 +1,102 @@
+from concurrent.futures import Future
+
+import grpc
+from branch import Branch
+from channel_pool import BASE_PORT, branch_target
+
+METHODS = ("MsgDelivery", "MsgDeliveryBatch", "MsgDeliveryStream", "Health", "GetStats")
+
+
+class LocalRpcError(grpc.RpcError):
+    def __init__(self, code, details):
+        super().__init__(details)
+        self.statusCode = code
+        self.statusDetails = details
+
+    def code(self):
+        return self.statusCode
+
+    def details(self):
+        return self.statusDetails
+
+
+class LocalContext:
+    # The part of grpc.ServicerContext the Branch handlers use.
+    def abort(self, code, details):
+        raise LocalRpcError(code, details)
+
+
+CONTEXT = LocalContext()
+
+
+class LocalMethod:
+    # Calls the servicer's handler on the caller's thread with the request
+    # object itself; nothing is serialized. Extra gRPC call options such as
+    # timeout are accepted and ignored.
+    def __init__(self, transport, target, name):
+        self.transport = transport
+        self.target = target
+        self.name = name
+
+    def __call__(self, request, **kwargs):
+        servicer = self.transport.servicers.get(self.target)
+        if servicer is None:
+            raise LocalRpcError(grpc.StatusCode.UNAVAILABLE, f"no branch at {self.target}")
+        return getattr(servicer, self.name)(request, CONTEXT)
+
+    def future(self, request, **kwargs):
+        # Already done when returned, so done callbacks run right away.
+        future = Future()
+        try:
+            future.set_result(self(request))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+class LocalStub:
+    def __init__(self, transport, target):
+        for name in METHODS:
+            setattr(self, name, LocalMethod(transport, target, name))
+
+
+class LocalTransport:
+    # In-process stand-in for channel_pool.ChannelPool, for when every
+    # branch and customer share one process: stubs call the registered
+    # Branch directly instead of going through gRPC and localhost TCP. The
+    # handlers are the same, so logs and clocks are too.
+    def __init__(self):
+        self.servicers = {}
+        self.stubs = {}
+
+    def register(self, target, servicer):
+        self.servicers[target] = servicer
+
+    def stub(self, target):
+        stub = self.stubs.get(target)
+        if stub is None:
+            stub = self.stubs[target] = LocalStub(self, target)
+        return stub
+
+    def warm(self, targets, timeout=None):
+        return [target for target in targets if target not in self.servicers]
+
+    def close(self):
+        self.servicers.clear()
+        self.stubs.clear()
+
+
+def create_local_branches(branches, transport, base_port=BASE_PORT, branch_class=None, **options):
+    # Branch objects registered with `transport` under their usual targets.
+    # `branch_class` swaps in a Branch subclass, as for create_grpc_servers.
+    ids = [branch["id"] for branch in branches]
+    branch_class = branch_class or Branch
+    servicers = []
+    for branch_data in branches:
+        branch = branch_class(id=branch_data["id"], balance=branch_data["balance"], branches=ids,
+                              base_port=base_port, pool=transport, **options)
+        transport.register(branch_target(branch.id, base_port), branch)
+        servicers.append(branch)
+    for branch in servicers:
+        branch.warmPeers()
+    return servicers
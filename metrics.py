@@ -0,0 +1,148 @@
+import bisect
+import threading
+import time
+
+import bank_pb2
+
+# Histogram bucket upper bounds in microseconds, four per doubling from 1us
+# to about 70s. Percentiles are reported as the bound of their bucket, so
+# they are within 19% of the true value.
+BOUNDS = [2 ** (i / 4) for i in range(105)]
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        us = seconds * 1e6
+        self.buckets[bisect.bisect_left(BOUNDS, us)] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def merge(self, buckets, count, total, max):
+        for i, n in enumerate(buckets):
+            self.buckets[i] += n
+        self.count += count
+        self.total += total
+        self.max = max if max > self.max else self.max
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0.0
+        rank = pct / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(BOUNDS[i] if i < len(BOUNDS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        # Milliseconds.
+        return {
+            "count": self.count,
+            "mean": self.total / self.count / 1000 if self.count else 0.0,
+            "p50": self.percentile(50) / 1000,
+            "p95": self.percentile(95) / 1000,
+            "p99": self.percentile(99) / 1000,
+            "max": self.max / 1000,
+        }
+
+
+class Metrics:
+    # Counters, latency histograms and gauges for one branch. Code paths that
+    # record into it check for None first, so a branch without metrics pays
+    # one comparison per call.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.inflight = 0
+        self.gauge("inflight", lambda: self.inflight)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        # Returns a callable that records the time since now under `name`.
+        # It takes and ignores any arguments so it can be a done callback.
+        start = time.perf_counter()
+
+        def done(*args):
+            self.observe(name, time.perf_counter() - start)
+        return done
+
+    def gauge(self, name, read):
+        self.gauges[name] = read
+
+    def begin(self):
+        with self.lock:
+            self.inflight += 1
+        return time.perf_counter()
+
+    def end(self, name, start):
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.inflight -= 1
+        self.observe(name, elapsed)
+
+
+def to_response(id, metrics):
+    if metrics is None:
+        return bank_pb2.StatsResponse(id=id, enabled=False)
+    response = bank_pb2.StatsResponse(id=id, enabled=True)
+    with metrics.lock:
+        response.counters.update(metrics.counters)
+        for name, histogram in sorted(metrics.histograms.items()):
+            response.latencies.add(name=name, count=histogram.count, total_us=histogram.total,
+                                   max_us=histogram.max, buckets=histogram.buckets)
+    for name, read in list(metrics.gauges.items()):
+        response.gauges[name] = read()
+    return response
+
+
+def merge_responses(responses):
+    # Adds up the stats of several branches, histograms bucket by bucket.
+    counters, gauges, histograms = {}, {}, {}
+    for response in responses:
+        for name, value in response.counters.items():
+            counters[name] = counters.get(name, 0) + value
+        for name, value in response.gauges.items():
+            gauges[name] = gauges.get(name, 0) + value
+        for latency in response.latencies:
+            histogram = histograms.setdefault(latency.name, Histogram())
+            histogram.merge(latency.buckets, latency.count, latency.total_us, latency.max_us)
+    return counters, gauges, histograms
+
+
+def natural_key(name):
+    # "propagate.peer.10" sorts after "propagate.peer.9".
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in name.split(".")]
+
+
+def format_summary(counters, gauges, histograms):
+    lines = [f"{'latency':<28} {'count':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+    for name in sorted(histograms, key=natural_key):
+        stats = histograms[name].summary()
+        lines.append(f"{name:<28} {stats['count']:>9} {stats['mean']:>9.3f} {stats['p50']:>9.3f} "
+                     f"{stats['p95']:>9.3f} {stats['p99']:>9.3f} {stats['max']:>9.3f}")
+    for name in sorted(counters, key=natural_key):
+        lines.append(f"{name:<28} {counters[name]:>9}")
+    for name in sorted(gauges, key=natural_key):
+        lines.append(f"{name + ' (now)':<28} {gauges[name]:>9}")
+    return "\n".join(lines)
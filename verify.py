@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy
+
+from columnar import ColumnarFile
+from events import INTERFACES, INTERFACE_CODES
+
+# Same verdicts as checks/checker_part_{1,2,3}.py, computed with array ops
+# over all events at once instead of printing a line per event.
+PROPAGATE_CODES = [code for code, interface in enumerate(INTERFACES) if interface.startswith("propogate")]
+UNKNOWN_INTERFACE = 255
+
+
+class Events:
+    # Flat columns for every event of one output file, in file order.
+    def __init__(self, ids, request_ids, clocks, interfaces):
+        self.ids = numpy.asarray(ids, dtype=numpy.int64)
+        self.requestIds = numpy.asarray(request_ids, dtype=numpy.int64)
+        self.clocks = numpy.asarray(clocks, dtype=numpy.int64)
+        self.interfaces = numpy.asarray(interfaces, dtype=numpy.uint8)
+
+    def __len__(self):
+        return len(self.clocks)
+
+
+class CheckResult:
+    def __init__(self, name, total, bad, events, limit):
+        self.name = name
+        self.total = total
+        self.failed = int(bad.sum())
+        self.violations = [
+            {"index": int(i), "id": int(events.ids[i]), "customer-request-id": int(events.requestIds[i]),
+             "logical_clock": int(events.clocks[i])}
+            for i in numpy.flatnonzero(bad)[:limit]
+        ]
+
+    @property
+    def ok(self):
+        return self.failed == 0
+
+    def summary(self):
+        return f"{self.name}: {self.total - self.failed} of {self.total} events correct, {self.failed} violations"
+
+
+def load_events(path):
+    # Accepts a JSON output (grouped like output-1/2 or flat like output-3)
+    # or its columnar export.
+    if path.endswith(".col"):
+        # The columns stay backed by the mapping for as long as they are used.
+        columns = ColumnarFile(path)
+        return Events(numpy.repeat(columns["group_id"], columns["group_len"]), columns["request_id"],
+                      columns["clock"], columns["interface"])
+    with open(path, "r") as file:
+        data = json.load(file)
+    if data and "events" in data[0]:
+        rows = [(group["id"], event) for group in data for event in group["events"]]
+    else:
+        rows = [(event["id"], event) for event in data]
+    return Events([id for id, _ in rows],
+                  [event["customer-request-id"] for _, event in rows],
+                  [event["logical_clock"] for _, event in rows],
+                  [INTERFACE_CODES.get(event["interface"], UNKNOWN_INTERFACE) for _, event in rows])
+
+
+def group_starts(keys):
+    # keys must already be grouped; True where a new group begins.
+    starts = numpy.ones(len(keys), dtype=bool)
+    starts[1:] = keys[1:] != keys[:-1]
+    return starts
+
+
+def check_customers(events, limit=10):
+    # Every customer's clocks strictly increase in the order they were sent.
+    order = numpy.argsort(events.ids, kind="stable")
+    ids = events.ids[order]
+    clocks = events.clocks[order]
+    starts = group_starts(ids)
+    # Offsetting each group above the previous one lets one running maximum
+    # restart at every customer.
+    offset = numpy.cumsum(starts) * (int(clocks.max(initial=0)) + 1)
+    running = numpy.maximum.accumulate(clocks + offset)
+    previous = numpy.empty_like(running)
+    previous[1:] = running[:-1]
+    previous[starts] = offset[starts]
+    bad = numpy.zeros(len(events), dtype=bool)
+    bad[order] = clocks + offset <= previous
+    return CheckResult("customer clocks", len(events), bad, events, limit)
+
+
+def check_branches(events, limit=10):
+    # Every branch logs strictly increasing clocks.
+    order = numpy.argsort(events.ids, kind="stable")
+    clocks = events.clocks[order]
+    starts = group_starts(events.ids[order])
+    previous = numpy.empty_like(clocks)
+    previous[1:] = clocks[:-1]
+    previous[starts] = -1
+    bad = numpy.zeros(len(events), dtype=bool)
+    bad[order] = clocks <= previous
+    return CheckResult("branch clocks", len(events), bad, events, limit)
+
+
+def check_requests(events, limit=10):
+    # Within a request, no customer-side or receiving event may come after a
+    # propagation that happened at a lower clock.
+    order = numpy.lexsort((events.clocks, events.requestIds))
+    clocks = events.clocks[order]
+    starts = group_starts(events.requestIds[order])
+    propagate = numpy.isin(events.interfaces[order], PROPAGATE_CODES)
+    positions = numpy.arange(len(order))
+    group_start = numpy.maximum.accumulate(numpy.where(starts, positions, 0))
+    last = numpy.maximum.accumulate(numpy.where(propagate, positions, -1))
+    before = numpy.full(len(order), -1)
+    before[1:] = last[:-1]
+    seen = before >= group_start
+    bad = numpy.zeros(len(events), dtype=bool)
+    bad[order] = ~propagate & seen & (clocks > clocks[numpy.maximum(before, 0)])
+    return CheckResult("request order", len(events), bad, events, limit)
+
+
+def verify(customer_path, branch_path, all_path, limit=10):
+    return [
+        check_customers(load_events(customer_path), limit),
+        check_branches(load_events(branch_path), limit),
+        check_requests(load_events(all_path), limit),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check the clocks in output-1/2/3 in one pass.")
+    parser.add_argument("--dir", default="output", help="directory holding the output files")
+    parser.add_argument("--columnar", action="store_true", help="read the output-N.col exports instead of JSON")
+    parser.add_argument("--limit", type=int, default=10, help="violations to list per check")
+    args = parser.parse_args()
+    extension = "col" if args.columnar else "json"
+    paths = [os.path.join(args.dir, f"output-{n}.{extension}") for n in (1, 2, 3)]
+    results = verify(*paths, limit=args.limit)
+    for result in results:
+        print(result.summary())
+        for violation in result.violations:
+            print(f"  {violation}")
+    sys.exit(0 if all(result.ok for result in results) else 1)
@@ -0,0 +1,233 @@
+import os
+import struct
+import threading
+import zlib
+from array import array
+
+from accounts import AccountTable
+
+# One record per applied update: kind, origin branch, log sequence number,
+# the Lamport clock after the update, the amount (added for ADD, the new
+# balance for SET, every account's starting balance for INIT), the origin's
+# delta sequence number (0 with absolute replication) and the account. Each
+# commit writes its records as one frame, prefixed by
+# their length and crc32, so a torn write is caught at replay.
+RECORD = struct.Struct("<B3xiqqqqq")
+FRAME = struct.Struct("<II")
+ADD, SET, INIT = range(3)
+
+# A snapshot is the state after record `lsn`: magic, crc32 of the rest,
+# lsn, starting balance, clock, own delta seq and the number of origins,
+# followed per origin by its version and the seqs applied ahead of it, then
+# the number of account shards and per shard its array of balances and its
+# other (account, balance) pairs, see accounts.AccountTable.
+SNAPSHOT_MAGIC = b"BANKSNP2"
+SNAPSHOT = struct.Struct("<8sIqqqqI")
+VERSION = struct.Struct("<iqI")
+SHARD = struct.Struct("<QI")
+
+
+class Snapshot:
+    def __init__(self, lsn, clock, seq, versions, ahead, accounts):
+        self.lsn = lsn
+        self.clock = clock
+        self.seq = seq
+        self.versions = versions
+        self.ahead = ahead
+        self.accounts = accounts
+
+
+def encode_snapshot(snapshot):
+    # An origin can have updates ahead before it has a version.
+    origins = sorted(set(snapshot.versions) | set(snapshot.ahead))
+    body = bytearray()
+    for origin in origins:
+        ahead = sorted(snapshot.ahead.get(origin, ()))
+        body += VERSION.pack(origin, snapshot.versions.get(origin, 0), len(ahead))
+        body += struct.pack(f"<{len(ahead)}q", *ahead)
+    body += struct.pack("<I", len(snapshot.accounts.shards))
+    for shard in snapshot.accounts.shards:
+        body += SHARD.pack(len(shard.dense), len(shard.sparse))
+        body += shard.dense.tobytes()
+        body += struct.pack(f"<{2 * len(shard.sparse)}q", *[value for item in shard.sparse.items() for value in item])
+    head = struct.pack("<qqqqI", snapshot.lsn, snapshot.accounts.initial, snapshot.clock, snapshot.seq,
+                       len(origins))
+    crc = zlib.crc32(body, zlib.crc32(head))
+    return SNAPSHOT_MAGIC + struct.pack("<I", crc) + head + body
+
+
+def decode_snapshot(data):
+    magic, crc, lsn, initial, clock, seq, origins = SNAPSHOT.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or zlib.crc32(data[12:]) != crc:
+        raise ValueError("corrupt snapshot")
+    versions, ahead = {}, {}
+    offset = SNAPSHOT.size
+    for _ in range(origins):
+        origin, version, count = VERSION.unpack_from(data, offset)
+        offset += VERSION.size
+        if version:
+            versions[origin] = version
+        if count:
+            ahead[origin] = set(struct.unpack_from(f"<{count}q", data, offset))
+            offset += 8 * count
+    (shards,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    accounts = AccountTable(initial, shards)
+    for shard in accounts.shards:
+        dense, sparse = SHARD.unpack_from(data, offset)
+        offset += SHARD.size
+        shard.dense = array("q", data[offset:offset + 8 * dense])
+        offset += 8 * dense
+        pairs = struct.unpack_from(f"<{2 * sparse}q", data, offset)
+        shard.sparse = dict(zip(pairs[::2], pairs[1::2]))
+        offset += 16 * sparse
+    return Snapshot(lsn, clock, seq, versions, ahead, accounts)
+
+
+def read_records(data):
+    # Returns the (kind, origin, lsn, clock, amount, seq, account) records of every
+    # frame up to the first torn or corrupt one, and the length of that
+    # valid prefix.
+    records = []
+    offset = 0
+    view = memoryview(data)
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        end = start + length
+        if end > len(data) or length % RECORD.size or zlib.crc32(view[start:end]) != crc:
+            break
+        records.extend(RECORD.iter_unpack(view[start:end]))
+        offset = end
+    return records, offset
+
+
+class WriteAheadLog:
+    # Binary log of the updates a branch applied, plus its latest snapshot,
+    # in `directory`. Records are buffered by append and made durable by
+    # commit: whichever caller finds no write in progress writes and fsyncs
+    # everything appended so far, the others wait for it (group commit).
+    # Opening reads what an earlier run left, see replay.
+    def __init__(self, directory, id, fsync=True, metrics=None):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"branch-{id}.wal")
+        self.snapshotPath = os.path.join(directory, f"branch-{id}.snap")
+        self.fsync = fsync
+        self.metrics = metrics
+        self.snapshot, self.recovered, valid = self.read()
+        self.file = open(self.path, "r+b" if os.path.exists(self.path) else "w+b")
+        # Drops a torn tail left by a crash mid-write.
+        self.file.truncate(valid)
+        self.file.seek(valid)
+        self.lsn = self.recovered[-1][2] if self.recovered else (self.snapshot.lsn if self.snapshot else 0)
+        self.durable = self.lsn
+        self.records = len(self.recovered)
+        self.buffer = bytearray()
+        self.writing = False
+        self.cond = threading.Condition()
+
+    def read(self):
+        # Returns the snapshot (or None), the records logged after it and
+        # the length of the log's valid prefix.
+        snapshot = None
+        if os.path.exists(self.snapshotPath):
+            with open(self.snapshotPath, "rb") as file:
+                snapshot = decode_snapshot(file.read())
+        if not os.path.exists(self.path):
+            return snapshot, [], 0
+        with open(self.path, "rb") as file:
+            data = file.read()
+        records, valid = read_records(data)
+        if snapshot is not None:
+            # A crash between writing a snapshot and emptying the log
+            # leaves records the snapshot already covers.
+            records = [record for record in records if record[2] > snapshot.lsn]
+        return snapshot, records, valid
+
+    def replay(self):
+        # The recovered snapshot (or None) and the records to apply on top
+        # of it, handed over once.
+        snapshot, records = self.snapshot, self.recovered
+        self.snapshot, self.recovered = None, []
+        return snapshot, records
+
+    def append(self, kind, origin, clock, amount, seq, account):
+        # Called in update order, under the branch lock.
+        with self.cond:
+            self.lsn += 1
+            self.buffer += RECORD.pack(kind, origin, self.lsn, clock, amount, seq, account)
+            self.records += 1
+
+    def commit(self):
+        # Returns once every record appended before the call is durable.
+        with self.cond:
+            target = self.lsn
+            while self.writing and self.durable < target:
+                self.cond.wait()
+            if self.durable >= target:
+                return
+            data, upto = self.claim()
+        self.write(data, upto)
+        self.release()
+
+    def claim(self):
+        # Caller holds self.cond; makes it the one writer.
+        self.writing = True
+        data, upto = bytes(self.buffer), self.lsn
+        self.buffer.clear()
+        return data, upto
+
+    def release(self):
+        with self.cond:
+            self.writing = False
+            self.cond.notify_all()
+
+    def write(self, data, upto):
+        if self.metrics is not None:
+            synced = self.metrics.timer("wal.commit")
+        try:
+            if data:
+                self.file.write(FRAME.pack(len(data), zlib.crc32(data)))
+                self.file.write(data)
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+        except BaseException:
+            with self.cond:
+                # Back in front of the buffer for the next writer to retry.
+                self.buffer[:0] = data
+            self.release()
+            raise
+        with self.cond:
+            self.durable = upto
+        if self.metrics is not None:
+            synced()
+            self.metrics.count("wal.commits")
+            self.metrics.count("wal.records", len(data) // RECORD.size)
+
+    def takeSnapshot(self, clock, seq, versions, ahead, accounts):
+        # Called under every branch lock, so the state matches the last
+        # record appended. The snapshot replaces the log, which starts over.
+        with self.cond:
+            self.cond.wait_for(lambda: not self.writing)
+            data, upto = self.claim()
+        self.write(data, upto)
+        try:
+            temp = self.snapshotPath + ".tmp"
+            with open(temp, "wb") as file:
+                file.write(encode_snapshot(Snapshot(upto, clock, seq, versions, ahead, accounts)))
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+            os.replace(temp, self.snapshotPath)
+            self.file.truncate(0)
+            self.file.seek(0)
+            self.records = 0
+        finally:
+            self.release()
+        if self.metrics is not None:
+            self.metrics.count("wal.snapshots")
+
+    def close(self):
+        self.commit()
+        self.file.close()